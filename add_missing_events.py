@@ -1,10 +1,14 @@
 import json
 import os
-from datetime import datetime, timezone, timedelta
+import glob
+from datetime import datetime
+from zoneinfo import ZoneInfo
+# Same atomic temp-file + fsync + rename writer the server uses for its files
+from power_monitor_server import write_atomic
 
-EVENT_LOG_FILE = "/root/geminicli/light-monitor-kyiv/event_log.json"
-TZ_OFFSET = 2
-KYIV_TZ = timezone(timedelta(hours=TZ_OFFSET))
+LOG_DIR = "/root/geminicli/light-monitor-kyiv"
+EVENT_LOG_GLOB = os.path.join(LOG_DIR, "event_log-*.jsonl")
+KYIV_TZ = ZoneInfo("Europe/Kyiv")
 
 def get_ts(y, m, d, H, M):
     dt = datetime(y, m, d, H, M, tzinfo=KYIV_TZ)
@@ -32,12 +36,16 @@ new_events_data = [
     (2026, 2, 11, 9, 51, 'down')
 ]
 
-# Load existing
+def month_file(ts):
+    month = datetime.fromtimestamp(ts, KYIV_TZ).strftime("%Y-%m")
+    return os.path.join(LOG_DIR, f"event_log-{month}.jsonl")
+
+# Load existing (one file per month)
 existing_events = []
-if os.path.exists(EVENT_LOG_FILE):
+for path in sorted(glob.glob(EVENT_LOG_GLOB)):
     try:
-        with open(EVENT_LOG_FILE, 'r') as f:
-            existing_events = json.load(f)
+        with open(path, 'r') as f:
+            existing_events += [json.loads(line) for line in f if line.strip()]
     except:
         pass
 
@@ -77,8 +85,11 @@ for e in new_events:
 # Sort by timestamp
 merged.sort(key=lambda x: x['timestamp'])
 
-# Save
-with open(EVENT_LOG_FILE, 'w') as f:
-    json.dump(merged, f, indent=2)
+# Save, each event into its month's file
+by_month = {}
+for e in merged:
+    by_month.setdefault(month_file(e['timestamp']), []).append(e)
+for path, month_events in by_month.items():
+    write_atomic(path, "".join(json.dumps(e) + "\n" for e in month_events).encode("utf-8"))
 
 print(f"Total events: {len(merged)}")
@@ -1,12 +1,18 @@
 import json
+import glob
 import datetime
+# Same atomic temp-file + fsync + rename writer the server uses for its files
+from power_monitor_server import write_atomic
 
-LOG_FILE = "/root/geminicli/light-monitor-kyiv/event_log.json"
+LOG_GLOB = "/root/geminicli/light-monitor-kyiv/event_log-*.jsonl"  # one file per month
 STATE_FILE = "/root/geminicli/light-monitor-kyiv/power_monitor_state.json"
 
 # 1. Clean Log
-with open(LOG_FILE, 'r') as f:
-    events = json.load(f)
+log_files = sorted(glob.glob(LOG_GLOB))
+events = []
+for path in log_files:
+    with open(path, 'r') as f:
+        events += [dict(json.loads(line), _file=path) for line in f if line.strip()]
 
 # Keep events strictly BEFORE 12.02.2026 10:50:00 UTC+2
 # Timestamp calculation:
@@ -40,8 +46,10 @@ for e in events:
 # Just keep everything <= 1770886172 (approx 10:49:32)
 # Let's use the explicit list from loop.
 
-with open(LOG_FILE, 'w') as f:
-    json.dump(valid_events, f, indent=2)
+# Rewrite every monthly file with just its kept events
+for path in log_files:
+    write_atomic(path, "".join(json.dumps({k: v for k, v in e.items() if k != '_file'}) + "\n"
+                               for e in valid_events if e['_file'] == path).encode("utf-8"))
 
 print(f"Log cleaned. Kept {len(valid_events)} events.")
 
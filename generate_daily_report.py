@@ -11,20 +11,48 @@ import shutil
 # --- Configuration ---
 TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 CHAT_ID = os.environ.get("TELEGRAM_CHANNEL_ID")
-EVENT_LOG_FILE = "event_log.json"
+EVENT_LOG_PATTERN = "event_log-{}.jsonl"  # one JSON-Lines file per month (YYYY-MM)
+LEGACY_EVENT_LOG_FILE = "event_log.json"
 SCHEDULE_FILE = "last_schedules.json"
 HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule_history.json")
 REPORT_ID_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daily_report_id.json")
 KYIV_TZ = ZoneInfo("Europe/Kyiv")
 
-def load_events():
-    if not os.path.exists(EVENT_LOG_FILE):
-        return []
-    try:
-        with open(EVENT_LOG_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return []
+def load_events(start_date, end_date):
+    """
+    Reads the monthly JSON-Lines event logs (event_log-YYYY-MM.jsonl) written by
+    power_monitor_server.py, oldest first, for the months covering start_date to
+    end_date plus the month before, which holds the state the window starts in.
+    Falls back to the old JSON-array event_log.json until the server has split it
+    into months.
+    """
+    files = []
+    month = (start_date.replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+    while month <= end_date:
+        path = EVENT_LOG_PATTERN.format(month.strftime("%Y-%m"))
+        if os.path.exists(path):
+            files.append(path)
+        month = (month + datetime.timedelta(days=32)).replace(day=1)
+    if not files:
+        if os.path.exists(LEGACY_EVENT_LOG_FILE):
+            try:
+                with open(LEGACY_EVENT_LOG_FILE, 'r') as f:
+                    return json.load(f)
+            except:
+                return []
+        print(f"Warning: no event log files for {start_date} - {end_date}; the report will have no events")
+    
+    events = []
+    for path in files:
+        with open(path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    return events
 
 def load_schedule_slots(target_date):
     """
@@ -383,7 +411,7 @@ if __name__ == "__main__":
         
     print(f"Generating report for {target_date}...")
     
-    events = load_events()
+    events = load_events(target_date, target_date)
     slots = load_schedule_slots(target_date)
     
     intervals = get_intervals_for_date(target_date, events)
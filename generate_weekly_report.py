@@ -12,7 +12,6 @@ from generate_daily_report import load_events, get_intervals_for_date, format_du
 # --- Configuration ---
 TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 CHAT_ID = os.environ.get("TELEGRAM_CHANNEL_ID")
-EVENT_LOG_FILE = "event_log.json"
 HISTORY_FILE = "schedule_history.json"
 
 def get_schedule_slots(date_obj):
@@ -265,7 +264,7 @@ if __name__ == "__main__":
         
     print(f"Generating weekly report for: {monday} to {sunday}...")
     
-    events = load_events()
+    events = load_events(monday, sunday)
     stats = get_weekly_stats(monday, sunday, events)
     
     # If output is specified, use that filename
@@ -1,9 +1,15 @@
 import os
 import json
+import heapq
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo
-from typing import Optional
+from typing import NamedTuple, Optional
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from itertools import compress
+from operator import ne
 
 # === Configuration ===
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
@@ -17,25 +23,42 @@ KYIV_TZ = ZoneInfo("Europe/Kyiv")
 
 GITHUB_URL = "https://raw.githubusercontent.com/Baskerville42/outage-data-ua/main/data/{region}.json"
 YASNO_URL = "https://app.yasno.ua/api/blackout-service/public/shutdowns/regions/{region_id}/dsos/{dso_id}/planned-outages"
+TELEGRAM_API = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
+
+# Shared keep-alive session: GitHub, Yasno and Telegram calls reuse TCP/TLS connections
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+SESSION.headers.update({"User-Agent": "Mozilla/5.0"})
+TG_HEADERS = {"Content-Type": "application/json"}
+
+# Indexed by datetime.weekday()
+DAYS_UA = (
+    "Понеділок",
+    "Вівторок",
+    "Середа",
+    "Четвер",
+    "П'ятниця",
+    "Субота",
+    "Неділя"
+)
+
+# "HH:MM" label of each half-hour slot boundary, 0 -> "00:00" ... 48 -> "24:00"
+SLOT_TIMES = tuple(f"{i // 2:02d}:{i % 2 * 30:02d}" for i in range(49))
 
-DAYS_UA = {
-    0: "Понеділок",
-    1: "Вівторок",
-    2: "Середа",
-    3: "Четвер",
-    4: "П'ятниця",
-    5: "Субота",
-    6: "Неділя"
-}
+
+_config_cache = {"mtime_ns": None, "cfg": None}
 
 
 def load_config() -> dict:
-    """Load config with validation"""
+    """Load config with validation, re-parsing only when the file changes"""
     try:
+        mtime_ns = os.stat(CONFIG_FILE).st_mtime_ns
+        if mtime_ns == _config_cache["mtime_ns"]:
+            return _config_cache["cfg"]
         with open(CONFIG_FILE, "r", encoding="utf-8") as f:
             content = f.read()
             try:
-                return json.loads(content)
+                cfg = json.loads(content)
             except json.JSONDecodeError as e:
                 print(f"JSON Error in {CONFIG_FILE}:")
                 print(f"  Line {e.lineno}, Column {e.colno}: {e.msg}")
@@ -46,41 +69,71 @@ def load_config() -> dict:
     except FileNotFoundError:
         print(f"Config file not found: {CONFIG_FILE}")
         raise SystemExit(1)
+    
+    precompute_format(cfg)
+    _config_cache["mtime_ns"] = mtime_ns
+    _config_cache["cfg"] = cfg
+    return cfg
+
+
+def precompute_format(cfg: dict) -> dict:
+    """Build config-invariant separators and group headers once, stored under cfg['_precomputed']"""
+    fmt = cfg['ui']['format']
+    space_source = get_spacing(cfg, 'before_separator_source', 1)
+    pre = {
+        'source_sep': f"\n{space_source}{fmt['separator_source']}\n",
+        'day_sep': f"\n{fmt['separator_day']}\n",
+        'headers': {
+            grp: fmt['header_template'].format(group=grp.replace("GPV", ""))
+            for grp in cfg['settings']['groups']
+        },
+    }
+    cfg['_precomputed'] = pre
+    return pre
 
 
 def get_kyiv_now() -> datetime:
     return datetime.now(KYIV_TZ)
 
 
-def format_hours_full(hours: float) -> str:
-    """Format hours with shortened 'год.' suffix"""
+def _format_hours_full(hours: float) -> str:
     if hours == int(hours):
         hours = int(hours)
     return f"{hours} год."
 
 
-def format_hours_short(hours: float, cfg: dict) -> str:
+# Every half-hour step up to 48 h (a period merged across midnight), formatted once
+HOURS_FULL = {h / 2: _format_hours_full(h / 2) for h in range(97)}
+
+
+def format_hours_full(hours: float) -> str:
+    """Format hours with shortened 'год.' suffix"""
+    text = HOURS_FULL.get(hours)
+    return text if text is not None else _format_hours_full(hours)
+
+
+def get_hours_suffix(cfg: dict) -> str:
+    """Get short hours suffix; resolve once per render, not per period"""
+    return cfg['ui']['text'].get('hours_short', 'год.')
+
+
+# Suffix is part of the cache key, so a config change can never serve stale text
+@lru_cache(maxsize=128)
+def format_hours_short(hours: float, suffix: str) -> str:
     """Format hours short (for table), plain text"""
-    suffix = cfg['ui']['text'].get('hours_short', 'год.')
     if hours == int(hours):
         return f"{int(hours)} {suffix}"
     return f"{hours} {suffix}"
 
 
-def format_hours_short_bold(hours: float, cfg: dict) -> str:
+@lru_cache(maxsize=128)
+def format_hours_short_bold(hours: float, suffix: str) -> str:
     """Format hours short with bold number (for detail intervals)"""
-    suffix = cfg['ui']['text'].get('hours_short', 'год.')
     if hours == int(hours):
         return f"<b>{int(hours)}</b> {suffix}"
     return f"<b>{hours}</b> {suffix}"
 
 
-def format_slot_time(slot: int) -> str:
-    mins = slot * 30
-    h, m = mins // 60, mins % 60
-    return "24:00" if h == 24 else f"{h:02d}:{m:02d}"
-
-
 def get_spacing(cfg: dict, space_type: str, default: int = 1) -> str:
     """Get spacing string based on config"""
     spacing = cfg['ui'].get('spacing', {})
@@ -101,7 +154,7 @@ def fetch_github(cfg: dict) -> Optional[dict]:
         return None
     try:
         url = GITHUB_URL.format(region=cfg['settings']['region'])
-        r = requests.get(url, timeout=30)
+        r = SESSION.get(url, timeout=30)
         r.raise_for_status()
         return r.json()
     except Exception as e:
@@ -119,7 +172,7 @@ def fetch_yasno(cfg: dict) -> Optional[dict]:
             region_id=yasno_cfg.get('region_id', '25'),
             dso_id=yasno_cfg.get('dso_id', '902')
         )
-        r = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=30)
+        r = SESSION.get(url, timeout=30)
         r.raise_for_status()
         return r.json()
     except Exception as e:
@@ -129,20 +182,22 @@ def fetch_yasno(cfg: dict) -> Optional[dict]:
 
 # === Parsing ===
 
+# GitHub day payloads are keyed by hour number as string, "1" ... "24"
+HOUR_KEYS = tuple(str(h) for h in range(1, 25))
+
+# Hour state -> (first half-hour on, second half-hour on)
+GITHUB_HALVES = {
+    "yes": (True, True),
+    "no": (False, False),
+    "first": (False, True),
+    "second": (True, False)
+}
+
+
 def parse_github_day(day_data: dict) -> list[bool]:
     slots = []
-    for h in range(1, 25):
-        s = day_data.get(str(h), "yes")
-        if s == "yes":
-            slots.extend([True, True])
-        elif s == "no":
-            slots.extend([False, False])
-        elif s == "first":
-            slots.extend([False, True])
-        elif s == "second":
-            slots.extend([True, False])
-        else:
-            slots.extend([True, True])
+    for key in HOUR_KEYS:
+        slots.extend(GITHUB_HALVES.get(day_data.get(key, "yes"), (True, True)))
     return slots
 
 
@@ -152,17 +207,20 @@ def extract_github(data: dict, cfg: dict) -> dict:
         return res
     fact = data.get("fact", {}).get("data", {})
     
+    # Resolve dates once per timestamp, shared by all groups
+    day_meta = {}
+    for ts in heapq.nsmallest(2, fact.keys(), key=int):
+        dt = datetime.fromtimestamp(int(ts), tz=KYIV_TZ)
+        day_meta[ts] = (dt, dt.date().isoformat())
+    
     for grp in cfg['settings']['groups']:
         res[grp] = {}
-        for ts in sorted(fact.keys(), key=int)[:2]:
+        for ts, (dt, d_str) in day_meta.items():
             d = fact.get(ts, {}).get(grp)
             if not d:
                 continue
             
-            dt = datetime.fromtimestamp(int(ts), tz=KYIV_TZ)
-            d_str = dt.strftime("%Y-%m-%d")
-            
-            if all(d.get(str(h), "yes") == "yes" for h in range(1, 25)):
+            if all(d.get(key, "yes") == "yes" for key in HOUR_KEYS):
                 res[grp][d_str] = {"slots": None, "date": dt, "status": "pending"}
             else:
                 res[grp][d_str] = {"slots": parse_github_day(d), "date": dt, "status": "normal"}
@@ -186,7 +244,7 @@ def extract_yasno(data: dict, cfg: dict) -> dict:
                 continue
             
             dt = datetime.fromisoformat(d["date"])
-            d_str = dt.strftime("%Y-%m-%d")
+            d_str = dt.date().isoformat()
             status = d.get("status", "")
             
             if status == "EmergencyShutdowns":
@@ -199,10 +257,9 @@ def extract_yasno(data: dict, cfg: dict) -> dict:
             
             slots = [True] * 48
             for s in d["slots"]:
-                start, end = s.get("start", 0) // 30, s.get("end", 0) // 30
-                is_on = (s.get("type") == "NotPlanned")
-                for i in range(start, min(end, 48)):
-                    slots[i] = is_on
+                start, end = s.get("start", 0) // 30, min(s.get("end", 0) // 30, 48)
+                if end > start:
+                    slots[start:end] = [s.get("type") == "NotPlanned"] * (end - start)
             
             res[grp][d_str] = {"slots": slots, "date": dt, "status": "normal"}
     return res
@@ -210,56 +267,95 @@ def extract_yasno(data: dict, cfg: dict) -> dict:
 
 # === Processing ===
 
-def slots_to_periods(slots: list[bool]) -> list[dict]:
+class Period(NamedTuple):
+    start: str
+    end: str
+    is_on: bool
+    hours: float
+
+
+def slots_to_periods(slots: list[bool]) -> list[Period]:
     if not slots:
         return []
-    periods = []
-    curr, start = slots[0], 0
-    for i in range(1, len(slots)):
-        if slots[i] != curr:
-            periods.append({
-                "start": format_slot_time(start),
-                "end": format_slot_time(i),
-                "is_on": curr,
-                "hours": (i - start) * 0.5
-            })
-            curr, start = slots[i], i
-    periods.append({
-        "start": format_slot_time(start),
-        "end": format_slot_time(len(slots)),
-        "is_on": curr,
-        "hours": (len(slots) - start) * 0.5
-    })
-    return periods
+    # Run boundaries: every index where the state flips, plus both ends.
+    # map/compress keep the pairwise diff scan in C, like np.flatnonzero(np.diff(...)).
+    n = len(slots)
+    bounds = [0, *compress(range(1, n), map(ne, slots, slots[1:])), n]
+    return [
+        Period(SLOT_TIMES[start], SLOT_TIMES[end], slots[start], (end - start) * 0.5)
+        for start, end in zip(bounds, bounds[1:])
+    ]
+
+
+def atomic_write(path: str, data: str):
+    """Write file via temp file + rename so readers never see a partial file"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
 
 
 def get_cache() -> dict:
     try:
-        with open(CACHE_FILE, "r") as f:
-            return json.load(f)
-    except:
+        with open(CACHE_FILE, "rb") as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
         return {"github": {}, "yasno": {}}
 
 
 def save_cache(cache: dict):
-    with open(CACHE_FILE, "w") as f:
-        json.dump(cache, f, indent=2)
+    atomic_write(CACHE_FILE, json.dumps(cache, indent=2))
+
+
+def slots_by_date(sched: dict) -> dict:
+    """Flat date -> slots index over all groups; the first group with slots wins"""
+    index = {}
+    for days in sched.values():
+        for d_str, day in days.items():
+            if day.get("slots"):
+                index.setdefault(d_str, day["slots"])
+    return index
+
+
+def changed_days(new: dict, old: dict) -> list[str]:
+    """List source/group/date entries that differ between two caches"""
+    changed = []
+    for src in ("github", "yasno"):
+        new_src, old_src = new.get(src, {}), old.get(src, {})
+        for grp in sorted(new_src.keys() | old_src.keys()):
+            new_days, old_days = new_src.get(grp, {}), old_src.get(grp, {})
+            for d_str in sorted(new_days.keys() | old_days.keys()):
+                if new_days.get(d_str) != old_days.get(d_str):
+                    changed.append(f"{src}/{grp}/{d_str}")
+    return changed
 
 
 # === Formatting ===
 
-def render_intervals_detail(periods: list[dict], is_on: bool, cfg: dict) -> str:
-    """Render detailed intervals with monospace time and bold hours"""
+def split_periods(periods: list[Period]) -> tuple[list[Period], list[Period], float, float]:
+    """Partition periods into on/off lists and sum their hours in one pass"""
+    on_periods, off_periods = [], []
+    total_on = total_off = 0
+    for p in periods:
+        if p.is_on:
+            on_periods.append(p)
+            total_on += p.hours
+        else:
+            off_periods.append(p)
+            total_off += p.hours
+    return on_periods, off_periods, total_on, total_off
+
+
+# Renderers append their output to a shared `out` buffer that format_msg joins once
+
+def render_intervals_detail(out: list[str], periods: list[Period], total: float, is_on: bool, cfg: dict):
+    """Render detailed intervals (pre-filtered by split_periods) with monospace time and bold hours"""
     icons = cfg['ui']['icons']
     txt = cfg['ui']['text']
     indent = get_detail_indent(cfg)
-    
-    filtered = [p for p in periods if p['is_on'] == is_on]
-    
-    if not filtered:
-        return ""
-    
-    total = sum(p['hours'] for p in filtered)
+    suffix = get_hours_suffix(cfg)
     
     if is_on:
         icon = icons.get('light_on', '☀')
@@ -268,61 +364,53 @@ def render_intervals_detail(periods: list[dict], is_on: bool, cfg: dict) -> str:
         icon = icons.get('light_off', '⃠')
         label = txt.get('off_detail', 'Світла не буде')
     
-    lines = [f"{icon} {label} {format_hours_full(total)}:"]
+    out.append(f"{icon} {label} {format_hours_full(total)}:")
     
-    for p in filtered:
-        time_range = f"{p['start']}-{p['end']}"
-        dur = format_hours_short_bold(p['hours'], cfg)
+    for p in periods:
+        time_range = f"{p.start}-{p.end}"
+        dur = format_hours_short_bold(p.hours, suffix)
         # <code> for monospace time, <b> for bold hours in dur
-        lines.append(f"{indent}<code>{time_range}</code>  |  {dur}")
-    
-    return "\n".join(lines)
+        out.append(f"\n{indent}<code>{time_range}</code>  |  {dur}")
 
 
-def render_summary_simple(periods: list[dict], cfg: dict) -> str:
+def render_summary_simple(out: list[str], total_on: float, total_off: float, cfg: dict):
     """Render simple summary"""
     icons = cfg['ui']['icons']
     txt = cfg['ui']['text']
     
-    total_on = sum(p['hours'] for p in periods if p['is_on'])
-    total_off = sum(p['hours'] for p in periods if not p['is_on'])
-    
     icon_on = icons.get('on_list', icons['on'])
     icon_off = icons.get('off_list', icons['off'])
     
-    lines = [
-        f"{icon_on} {txt.get('on_full', 'Світло є')}: {format_hours_full(total_on)}",
-        f"{icon_off} {txt.get('off_full', 'Світла нема')}: {format_hours_full(total_off)}"
-    ]
-    return "\n".join(lines)
+    out.append(f"{icon_on} {txt.get('on_full', 'Світло є')}: {format_hours_full(total_on)}\n")
+    out.append(f"{icon_off} {txt.get('off_full', 'Світла нема')}: {format_hours_full(total_off)}")
 
 
-def render_summary(periods: list[dict], cfg: dict, stats_periods: list[dict] = None) -> str:
+def render_summary(out: list[str], periods: list[Period], cfg: dict, stats_periods: list[Period] = None):
     """Render summary with --- separators"""
     show_detail = cfg['settings'].get('show_intervals_detail', False)
     
     # Use stats_periods for calculation if available, otherwise periods
     calc_periods = stats_periods if stats_periods is not None else periods
     
+    # One pass feeds both the detail and the simple view
+    on_periods, off_periods, total_on, total_off = split_periods(calc_periods)
+    
+    out.append("\n---\n")
     if show_detail:
-        # For detailed view, we also use calc_periods to ensure math is correct per day
-        on_detail = render_intervals_detail(calc_periods, True, cfg)
-        off_detail = render_intervals_detail(calc_periods, False, cfg)
-        
-        parts = []
-        if on_detail:
-            parts.append(on_detail)
-        if off_detail:
-            parts.append(off_detail)
-        
-        content = "\n\n".join(parts)
+        # For detailed view, we also use calc_periods to ensure math is correct per day.
+        # Both sections render straight from the buckets; an empty bucket is skipped.
+        if on_periods:
+            render_intervals_detail(out, on_periods, total_on, True, cfg)
+        if on_periods and off_periods:
+            out.append("\n\n")
+        if off_periods:
+            render_intervals_detail(out, off_periods, total_off, False, cfg)
     else:
-        content = render_summary_simple(calc_periods, cfg)
-    
-    return f"\n---\n{content}\n---"
+        render_summary_simple(out, total_on, total_off, cfg)
+    out.append("\n---")
 
 
-def render_table(periods: list[dict], cfg: dict, stats_periods: list[dict] = None) -> str:
+def render_table(out: list[str], periods: list[Period], cfg: dict, stats_periods: list[Period] = None):
     """Render table wrapped in <pre>"""
     icons = cfg['ui']['icons']
     fmt = cfg['ui']['format']
@@ -334,111 +422,112 @@ def render_table(periods: list[dict], cfg: dict, stats_periods: list[dict] = Non
     sep_line = sep_char * total_width
     
     header = f"    {icons['off']}     |    {icons['on']}     |   {icons['clock']}"
+    suffix = get_hours_suffix(cfg)
     
-    lines = [sep_line, header, sep_line]
+    # Column widths are fixed per table: bind the row formatters once, with the
+    # empty column already padded into the template
+    row_on = f"{' ' * COL1}|{{:^{COL2}}}|{{:^{COL3}}}\n".format
+    row_off = f"{{:^{COL1}}}|{' ' * COL2}|{{:^{COL3}}}\n".format
+    
+    out.extend(("<pre>", sep_line, "\n", header, "\n", sep_line, "\n"))
     
     for p in periods:
-        time_range = f"{p['start']}-{p['end']}"
-        dur = format_hours_short(p['hours'], cfg)
-        
-        if p['is_on']:
-            row = f"{'':{COL1}}|{time_range:^{COL2}}|{dur:^{COL3}}"
-        else:
-            row = f"{time_range:^{COL1}}|{'':{COL2}}|{dur:^{COL3}}"
+        time_range = f"{p.start}-{p.end}"
+        dur = format_hours_short(p.hours, suffix)
         
-        lines.append(row)
+        out.append((row_on if p.is_on else row_off)(time_range, dur))
     
-    lines.append(sep_line)
-    
-    # Wrap entire table in <pre>
-    table_text = "\n".join(lines)
-    
-    summary = render_summary(periods, cfg, stats_periods)
-    
-    return f"<pre>{table_text}</pre>{summary}"
+    out.append(sep_line)
+    out.append("</pre>")
+    render_summary(out, periods, cfg, stats_periods)
 
 
-def render_list(periods: list[dict], cfg: dict, stats_periods: list[dict] = None) -> str:
+def render_list(out: list[str], periods: list[Period], cfg: dict, stats_periods: list[Period] = None):
     """Render list format"""
     icons = cfg['ui']['icons']
     
     icon_on = icons.get('on_list', icons['on'])
     icon_off = icons.get('off_list', icons['off'])
     
-    lines = []
-    
-    for p in periods:
-        ico = icon_on if p['is_on'] else icon_off
-        lines.append(f"{ico} {p['start']} - {p['end']} … ({format_hours_full(p['hours'])})")
-    
-    content = "\n".join(lines)
-    summary = render_summary(periods, cfg, stats_periods)
-    
-    return f"{content}{summary}"
+    out.append("\n".join(
+        f"{icon_on if p.is_on else icon_off} {p.start} - {p.end} … ({format_hours_full(p.hours)})"
+        for p in periods
+    ))
+    render_summary(out, periods, cfg, stats_periods)
 
 
-def render_day_body(periods: list[dict], status: str, cfg: dict, stats_periods: list[dict] = None) -> str:
+def render_day_body(out: list[str], periods: list[Period], status: str, cfg: dict, stats_periods: list[Period] = None):
     """Render the body of a day message (status or intervals)"""
     ui = cfg['ui']
     icons = ui['icons']
     txt = ui['text']
     
     if status == "emergency":
-        return f"{icons['emergency']} {txt['emergency']}"
+        out.append(f"{icons['emergency']} {txt['emergency']}")
     elif status == "pending":
-        return f"{icons['pending']} {txt['pending']}"
+        out.append(f"{icons['pending']} {txt['pending']}")
     elif periods:
         if cfg['settings']['style'] == "table":
-            return render_table(periods, cfg, stats_periods)
+            render_table(out, periods, cfg, stats_periods)
         else:
-            return render_list(periods, cfg, stats_periods)
-    return ""
+            render_list(out, periods, cfg, stats_periods)
 
 
-def format_day_header(date: datetime, src: str, cfg: dict) -> str:
-    """Format day header"""
-    icons = cfg['ui']['icons']
-    d_str = date.strftime("%d.%m")
-    day_name = DAYS_UA[date.weekday()]
-    src_name = cfg['sources'].get(src, {}).get('name', src)
-    return f"{icons['calendar']}  {d_str} ({day_name}) [{src_name}]:"
+@lru_cache(maxsize=64)
+def _day_header(day: int, month: int, weekday: int, icon: str, src_name: str) -> str:
+    return f"{icon}  {day:02d}.{month:02d} ({DAYS_UA[weekday]}) [{src_name}]:"
+
+
+def format_day_header(date: datetime, src: str | list[str], cfg: dict) -> str:
+    """Format day header; a list of sources is shown as one comma-separated bracket"""
+    sources = cfg['sources']
+    if isinstance(src, str):
+        src_name = sources.get(src, {}).get('name', src)
+    else:
+        src_name = ", ".join(sources.get(s, {}).get('name', s) for s in src)
+    return _day_header(date.day, date.month, date.weekday(), cfg['ui']['icons']['calendar'], src_name)
 
 
-def format_footer(cfg: dict) -> str:
+def format_footer(cfg: dict, now: Optional[datetime] = None) -> str:
     """Format footer with update time"""
     icons = cfg['ui']['icons']
     txt = cfg['ui']['text']
     
     sep = icons.get('separator', '⠅')
-    now = get_kyiv_now()
+    if now is None:
+        now = get_kyiv_now()
     time_str = now.strftime(f"%d.%m.%Y {sep}%H:%M")
     
     return f"{icons['clock']} {txt['updated']}: {time_str} (Київ)"
 
 
-def format_msg(gh: dict, ya: dict, cfg: dict) -> Optional[str]:
+def format_msg(gh: dict, ya: dict, cfg: dict, now: Optional[datetime] = None) -> Optional[str]:
     """Format complete message with merged intervals across midnight"""
+    if now is None:
+        now = get_kyiv_now()
     groups = cfg['settings']['groups']
-    fmt = cfg['ui']['format']
     
-    sep_source = fmt['separator_source']
-    sep_day = fmt['separator_day']
-    space_source = get_spacing(cfg, 'before_separator_source', 1)
+    # Configs that did not come through load_config() are precomputed on first use
+    pre = cfg.get('_precomputed') or precompute_format(cfg)
+    source_separator = pre['source_sep']
+    day_separator = pre['day_sep']
+    headers = pre['headers']
+    
+    # Only today and tomorrow are ever shown; build their keys once
+    today = now.date()
+    day_keys = (today.isoformat(), (today + timedelta(days=1)).isoformat())
     
-    blocks = []
+    # Single output buffer for the whole message, joined once at the end
+    out = []
     
     for grp in groups:
-        grp_num = grp.replace("GPV", "")
-        header = fmt['header_template'].format(group=grp_num)
+        header = headers[grp]
         
-        # Collect all dates
-        dates = set()
-        if grp in gh: dates.update(gh[grp].keys())
-        if grp in ya: dates.update(ya[grp].keys())
+        # Process today and tomorrow, whichever of them either source has
+        gh_days, ya_days = gh.get(grp, {}), ya.get(grp, {})
+        sorted_dates = [d for d in day_keys if d in gh_days or d in ya_days]
         
-        if not dates: continue
-        
-        sorted_dates = sorted(dates)[:2] # Process today and tomorrow
+        if not sorted_dates: continue
         
         # Prepare data structure for processing
         # day_data[date_str] = { 'github': {...}, 'yasno': {...}, 'periods': { 'github': [], 'yasno': [] } }
@@ -451,23 +540,27 @@ def format_msg(gh: dict, ya: dict, cfg: dict) -> Optional[str]:
             }
             
             # Check GitHub
-            g_d = gh.get(grp, {}).get(d_str)
+            g_d = gh_days.get(d_str)
             if g_d:
                 day_data_map[d_str]['date'] = g_d['date']
+                stats_periods = slots_to_periods(g_d['slots']) if g_d['slots'] else []
                 day_data_map[d_str]['sources']['github'] = {
                     'status': g_d['status'],
-                    'periods': slots_to_periods(g_d['slots']) if g_d['slots'] else [],
-                    'stats_periods': slots_to_periods(g_d['slots']) if g_d['slots'] else []
+                    # Shared until the midnight merge swaps in a merged copy
+                    'periods': stats_periods,
+                    'stats_periods': stats_periods
                 }
                 
             # Check Yasno
-            y_d = ya.get(grp, {}).get(d_str)
+            y_d = ya_days.get(d_str)
             if y_d:
                 day_data_map[d_str]['date'] = y_d['date'] or day_data_map[d_str]['date']
+                stats_periods = slots_to_periods(y_d['slots']) if y_d['slots'] else []
                 day_data_map[d_str]['sources']['yasno'] = {
                     'status': y_d['status'],
-                    'periods': slots_to_periods(y_d['slots']) if y_d['slots'] else [],
-                    'stats_periods': slots_to_periods(y_d['slots']) if y_d['slots'] else []
+                    # Shared until the midnight merge swaps in a merged copy
+                    'periods': stats_periods,
+                    'stats_periods': stats_periods
                 }
 
         # --- Filter "Tomorrow" if empty/pending ---
@@ -493,31 +586,33 @@ def format_msg(gh: dict, ya: dict, cfg: dict) -> Optional[str]:
             
             for src in ['github', 'yasno']:
                 if src in day_data_map[d1]['sources'] and src in day_data_map[d2]['sources']:
-                    p1 = day_data_map[d1]['sources'][src]['periods']
-                    p2 = day_data_map[d2]['sources'][src]['periods']
+                    s1 = day_data_map[d1]['sources'][src]
+                    s2 = day_data_map[d2]['sources'][src]
+                    p1, p2 = s1['periods'], s2['periods']
                     
                     if p1 and p2:
                         last_p1 = p1[-1]
                         first_p2 = p2[0]
                         
-                        if last_p1['is_on'] == first_p2['is_on']:
+                        if last_p1.is_on == first_p2.is_on:
                             # Merge!
-                            # Add hours
-                            last_p1['hours'] += first_p2['hours']
-                            # Update end time text (e.g., from "24:00" to "02:00")
-                            last_p1['end'] = first_p2['end']
+                            # Add hours and update end time text (e.g., from "24:00" to "02:00")
+                            merged_last = last_p1._replace(
+                                hours=last_p1.hours + first_p2.hours,
+                                end=first_p2.end
+                            )
                             
-                            # Remove first period from day 2
-                            p2.pop(0)
+                            # Build new lists so stats_periods keep the unmerged originals
+                            s1['periods'] = p1[:-1] + [merged_last]
+                            s2['periods'] = p2[1:]
                             
         # --- Rendering ---
-        day_msgs = []
+        group_rendered = False
         for d_str in sorted_dates:
             data = day_data_map[d_str]
             if not data['sources']: continue
             
             dt = data['date']
-            src_msgs = []
             
             # Check for match (if both sources exist and are identical)
             match = False
@@ -527,86 +622,114 @@ def format_msg(gh: dict, ya: dict, cfg: dict) -> Optional[str]:
             if gh_s and ya_s:
                 if gh_s['status'] == 'normal' and ya_s['status'] == 'normal':
                     # Compare periods (they might be modified, so compare structure)
-                    # We compare 'periods' (the merged ones) to decide if we can combine source headers
+                    # We compare 'periods' (the merged ones) to decide if we can combine source headers.
+                    # Whole Periods, hours included: a period merged into tomorrow can still end
+                    # at "24:00" (tomorrow fully on) and differ from an unmerged one only in hours
                     if gh_s['periods'] == ya_s['periods']:
                         match = True
             
             if match:
-                gh_name = cfg['sources']['github']['name']
-                ya_name = cfg['sources']['yasno']['name']
-                
-                head = format_day_header(dt, "github", cfg)
-                head = head.replace(f"[{gh_name}]", f"[{gh_name}, {ya_name}]")
+                head = format_day_header(dt, ["github", "yasno"], cfg)
                 # Use stats_periods for correct totals
-                body = render_day_body(gh_s['periods'], gh_s['status'], cfg, stats_periods=gh_s['stats_periods'])
-                src_msgs.append(f"{head}\n\n{body}")
+                src_items = [(head, gh_s)]
             else:
+                src_items = []
                 if gh_s:
-                    head = format_day_header(dt, "github", cfg)
-                    body = render_day_body(gh_s['periods'], gh_s['status'], cfg, stats_periods=gh_s['stats_periods'])
-                    src_msgs.append(f"{head}\n\n{body}")
+                    src_items.append((format_day_header(dt, "github", cfg), gh_s))
                 if ya_s:
-                    head = format_day_header(dt, "yasno", cfg)
-                    body = render_day_body(ya_s['periods'], ya_s['status'], cfg, stats_periods=ya_s['stats_periods'])
-                    src_msgs.append(f"{head}\n\n{body}")
+                    src_items.append((format_day_header(dt, "yasno", cfg), ya_s))
             
-            if src_msgs:
-                source_separator = f"\n{space_source}{sep_source}\n"
-                day_msgs.append(source_separator.join(src_msgs))
-        
-        if day_msgs:
-            day_separator = f"\n{sep_day}\n"
-            body = day_separator.join(day_msgs)
-            blocks.append(f"{header}\n\n{body}")
-    
-    if not blocks:
+            # Group header before its first day, day separator before the rest
+            if group_rendered:
+                out.append(day_separator)
+            else:
+                if out:
+                    out.append("\n\n")
+                out.append(header)
+                out.append("\n\n")
+                group_rendered = True
+            
+            for i, (head, src_s) in enumerate(src_items):
+                if i:
+                    out.append(source_separator)
+                out.append(head)
+                out.append("\n\n")
+                render_day_body(out, src_s['periods'], src_s['status'], cfg, stats_periods=src_s['stats_periods'])
+    
+    if not out:
         return None
     
-    body_text = "\n\n".join(blocks).rstrip()
-    footer = format_footer(cfg)
+    body_text = "".join(out).rstrip()
+    footer = format_footer(cfg, now)
     
     return f"{body_text}\n{footer}"
 
 
 # === Telegram ===
 
+def tg_call(method: str, payload: dict, timeout: int = 30) -> dict:
+    """Call a Telegram Bot API method and return the decoded response"""
+    # Encode once as raw UTF-8: the default \uXXXX escaping triples Cyrillic text size
+    body = json.dumps({"chat_id": TELEGRAM_CHANNEL_ID, **payload}, ensure_ascii=False).encode("utf-8")
+    r = SESSION.post(
+        f"{TELEGRAM_API}/{method}",
+        data=body,
+        headers=TG_HEADERS,
+        timeout=timeout
+    )
+    r.raise_for_status()
+    return r.json()
+
+
 def send_tg(text: str) -> Optional[int]:
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHANNEL_ID:
         print("Telegram credentials not configured")
         return None
     try:
-        r = requests.post(
-            f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage",
-            json={"chat_id": TELEGRAM_CHANNEL_ID, "text": text, "parse_mode": "HTML", "disable_notification": True},
-            timeout=30
-        )
-        r.raise_for_status()
-        return r.json()["result"]["message_id"]
+        res = tg_call("sendMessage", {"text": text, "parse_mode": "HTML", "disable_notification": True})
+        return res["result"]["message_id"]
     except Exception as e:
         print(f"Send failed: {e}")
         return None
 
 
+def delete_tg(mid: int):
+    try:
+        tg_call("deleteMessage", {"message_id": mid})
+    except Exception as e:
+        print(f"Delete failed for {mid}: {e}")
+
+
+def load_message_ids() -> list[int]:
+    if not os.path.exists(MESSAGES_FILE):
+        return []
+    try:
+        with open(MESSAGES_FILE, "rb") as f:
+            return json.loads(f.read())
+    except (OSError, ValueError) as e:
+        print(f"Could not read {MESSAGES_FILE}: {e}")
+        return []
+
+
+def save_message_ids(ids: list[int]):
+    atomic_write(MESSAGES_FILE, json.dumps(ids))
+
+
 def manage_msgs(mid: int, cfg: dict):
     max_msgs = cfg['settings'].get('max_messages', 3)
     
-    try:
-        with open(MESSAGES_FILE, "r") as f:
-            ids = json.load(f)
-    except:
-        ids = []
-    
+    ids = load_message_ids()
     ids.append(mid)
     
-    while len(ids) > max_msgs:
-        old = ids.pop(0)
-        requests.post(
-            f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/deleteMessage",
-            json={"chat_id": TELEGRAM_CHANNEL_ID, "message_id": old}
-        )
+    cut = max(len(ids) - max_msgs, 0)
+    expired, ids = ids[:cut], ids[cut:]
+    
+    # Deletes are independent of each other, so issue them concurrently
+    if expired:
+        with ThreadPoolExecutor(max_workers=min(len(expired), 4)) as ex:
+            list(ex.map(delete_tg, expired))
     
-    with open(MESSAGES_FILE, "w") as f:
-        json.dump(ids, f)
+    save_message_ids(ids)
 
 
 # === Main ===
@@ -625,8 +748,11 @@ def main():
     print(f"Yasno: {cfg['sources']['yasno'].get('enabled', False)}")
     
     print("\nFetching data...")
-    gh_data = fetch_github(cfg)
-    ya_data = fetch_yasno(cfg)
+    # Both fetches are network-bound; overlap them
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        gh_future = ex.submit(fetch_github, cfg)
+        ya_future = ex.submit(fetch_yasno, cfg)
+        gh_data, ya_data = gh_future.result(), ya_future.result()
     
     print(f"GitHub: {'OK' if gh_data else 'SKIP/FAIL'}")
     print(f"Yasno: {'OK' if ya_data else 'SKIP/FAIL'}")
@@ -638,63 +764,45 @@ def main():
     gh_sched = extract_github(gh_data, cfg)
     ya_sched = extract_yasno(ya_data, cfg)
     
-    def serialize(s):
-        r = {}
-        for g, d in s.items():
-            r[g] = {k: {"status": v["status"], "slots": v["slots"]} for k, v in d.items()}
-        return r
-    
-    new_c = {"github": serialize(gh_sched), "yasno": serialize(ya_sched)}
-    
     # --- History Saving Logic ---
     try:
         if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, "r") as f:
-                history = json.load(f)
+            with open(HISTORY_FILE, "rb") as f:
+                history = json.loads(f.read())
         else:
             history = {}
             
         # We want to save schedules for ALL dates we just received (Today and Tomorrow)
         # Prioritize Yasno, then GitHub
         
-        # Collect unique dates from both sources
-        all_fetched_dates = set()
-        if "yasno" in new_c:
-            for grp in new_c["yasno"]: all_fetched_dates.update(new_c["yasno"][grp].keys())
-        if "github" in new_c:
-            for grp in new_c["github"]: all_fetched_dates.update(new_c["github"][grp].keys())
+        yasno_by_date = slots_by_date(ya_sched)
+        github_by_date = slots_by_date(gh_sched)
 
         updated_dates = []
-        for d_str in all_fetched_dates:
-            slots_to_save = None
-            
-            # Try Yasno for this specific date
-            if "yasno" in new_c:
-                for grp, days in new_c["yasno"].items():
-                    if d_str in days and days[d_str].get("slots"):
-                        slots_to_save = days[d_str]["slots"]
-                        break
-            
-            # Try GitHub if no Yasno for this specific date
-            if not slots_to_save and "github" in new_c:
-                for grp, days in new_c["github"].items():
-                    if d_str in days and days[d_str].get("slots"):
-                        slots_to_save = days[d_str]["slots"]
-                        break
+        for d_str in yasno_by_date.keys() | github_by_date.keys():
+            slots_to_save = yasno_by_date.get(d_str) or github_by_date.get(d_str)
             
-            if slots_to_save:
+            # Only rewrite days whose slots actually differ
+            if slots_to_save and history.get(d_str) != slots_to_save:
                 history[d_str] = slots_to_save
                 updated_dates.append(d_str)
 
         if updated_dates:
-            with open(HISTORY_FILE, "w") as f:
-                json.dump(history, f, indent=2)
+            # Compact: indent=2 puts every one of the 48 slots on its own line
+            atomic_write(HISTORY_FILE, json.dumps(history, separators=(",", ":")))
             print(f"History updated for: {', '.join(updated_dates)}")
             
     except Exception as e:
         print(f"Error saving history: {e}")
     # ----------------------------
 
+    def serialize(s):
+        r = {}
+        for g, d in s.items():
+            r[g] = {k: {"status": v["status"], "slots": v["slots"]} for k, v in d.items()}
+        return r
+    
+    new_c = {"github": serialize(gh_sched), "yasno": serialize(ya_sched)}
     old_c = get_cache()
     
     if new_c == old_c and not force_send:
@@ -705,6 +813,8 @@ def main():
         print("Force send enabled.")
         
     print("Updates detected!")
+    for key in changed_days(new_c, old_c):
+        print(f"  changed: {key}")
     msg = format_msg(gh_sched, ya_sched, cfg)
     
     if msg:
@@ -1,15 +1,21 @@
 import http.server
-import socketserver
 import threading
 import time
 import json
 import os
 import secrets
+import hmac
 import datetime
+import email.utils
+import glob
+import queue
+import signal
+import socket
 from zoneinfo import ZoneInfo
-import requests
+import http.client
 import subprocess
-from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 # --- Configuration ---
 TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
@@ -18,8 +24,28 @@ PORT = 8889
 # SECRET_KEY handled in state
 STATE_FILE = "power_monitor_state.json"
 SCHEDULE_FILE = "last_schedules.json"
-EVENT_LOG_FILE = "event_log.json"
+# One append-only JSON-Lines file per Kyiv month: event_log-YYYY-MM.jsonl
+EVENT_LOG_PATTERN = "event_log-{}.jsonl"
+EVENT_LOG_GLOB = "event_log-*.jsonl"
+LEGACY_EVENT_LOG_FILE = "event_log.json"  # old JSON-array log; split into months on startup
+STATE_SAVE_INTERVAL = 60  # seconds between heartbeat-only state writes
+HEARTBEAT_TIMEOUT = 180  # seconds without a push before the light counts as gone
 KYIV_TZ = ZoneInfo("Europe/Kyiv")
+TELEGRAM_HOST = "api.telegram.org"
+TELEGRAM_SEND_PATH = f"/bot{TOKEN}/sendMessage"
+TG_HEADERS = {"Content-Type": "application/json"}
+
+# Keep-alive connection: notifications reuse one TLS connection to api.telegram.org.
+# Only the single _telegram_executor worker sends, so it needs no lock.
+_tg_conn = None
+# Telegram allows about 20 messages a minute into one channel; space sends out so a
+# burst of flapping notifications is delayed instead of rejected with 429
+TELEGRAM_MIN_INTERVAL = 3.0
+_tg_last_send = 0.0
+# Rate limits and transient server errors are retried; anything else is final
+TELEGRAM_RETRIES = 3
+TELEGRAM_RETRY_STATUSES = {429, 500, 502, 503, 504}
+TELEGRAM_MAX_RETRY_DELAY = 30.0  # cap on any one wait, including Telegram's retry_after
 
 # --- State Management ---
 state = {
@@ -30,52 +56,236 @@ state = {
     "secret_key": None
 }
 
-state_lock = threading.RLock()
+# Plain (non-reentrant) lock: save_state() must be called without it held
+state_lock = threading.Lock()
+# Set by the push handler when the status comes back up, waking monitor_loop
+heartbeat_event = threading.Event()
+# Set by stop_monitor() to end monitor_loop
+_shutdown = threading.Event()
 
-def trigger_daily_report_update():
+# Outage message waiting out DOWN_NOTIFY_DELAY: [message, threading.Timer] or None.
+# Reserved as [None, None] under state_lock when the outage is detected, so a
+# comeback racing the message being built still finds (and cancels) it.
+DOWN_NOTIFY_DELAY = 30
+_pending_down = None
+_pending_down_lock = threading.Lock()
+
+# Serializes writers of STATE_FILE's temp file; _last_state_save is a monotonic timestamp
+_state_file_lock = threading.Lock()
+_last_state_save = 0.0
+
+# Parsed files keyed by (path, parser): ((st_mtime_ns, st_size), data)
+_json_cache = {}
+_json_cache_lock = threading.Lock()
+
+def write_atomic(path, data, durable=True):
     """
-    Triggers the generation and update of the daily report chart.
-    Runs asynchronously to not block the main thread.
+    Replaces path with data (bytes) via a temp file and os.replace, so readers and
+    crashes only ever see the old or the new contents. durable=True fsyncs first.
+    Concurrent writers of the same path must serialize themselves.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def file_version(path):
+    """(mtime_ns, size) of a file; changes whenever the file is rewritten"""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+def load_cached(path, parse):
+    """
+    Returns parse(raw bytes) for a file, re-reading it only when its mtime or size changes.
+    Raises FileNotFoundError if the file is missing. Callers must not mutate the result.
+    """
+    key = file_version(path)
+    with _json_cache_lock:
+        cached = _json_cache.get((path, parse))
+    if cached and cached[0] == key:
+        return cached[1]
+    
+    with open(path, 'rb') as f:
+        data = parse(f.read())
+    with _json_cache_lock:
+        _json_cache[(path, parse)] = (key, data)
+    return data
+
+def load_json_cached(path):
+    return load_cached(path, json.loads)
+
+def parse_group_schedule(raw):
     """
-    def run_script():
+    Picks the monitored group's schedule out of last_schedules.json bytes.
+    Returns (group_key, {date: {"status", "slots"}}, {date: day_switches()}) from
+    Yasno, falling back to GitHub, or None when neither source has data.
+    Switch points are worked out here once per file version, not per event.
+    """
+    data = json.loads(raw)
+    source = data.get('yasno') or data.get('github')
+    if not source:
+        return None
+    group_key = next(iter(source))
+    days = source[group_key]
+    switches = {date: day_switches(day['slots']) for date, day in days.items() if day.get('slots')}
+    return (group_key, days, switches)
+
+def load_group_schedule():
+    """Cached parse_group_schedule() of SCHEDULE_FILE; raises FileNotFoundError if missing"""
+    return load_cached(SCHEDULE_FILE, parse_group_schedule)
+
+def parse_event_lines(raw):
+    """Parses JSON-Lines event log bytes, skipping blank or torn lines"""
+    events = []
+    for line in raw.splitlines():
+        if not line.strip():
+            continue
         try:
-            print("Triggering daily report update...")
-            # Assuming we are running in the project root or venv is available
-            # We use absolute path to be safe based on service file
-            python_exec = "/root/geminicli/light-monitor-kyiv/venv/bin/python"
-            script_path = "/root/geminicli/light-monitor-kyiv/generate_daily_report.py"
-            
-            # Run without --no-send so it updates Telegram
-            subprocess.run([python_exec, script_path], check=True)
-            
-            # Also trigger weekly report update
-            trigger_weekly_report_update()
-            
-        except Exception as e:
-            print(f"Failed to trigger daily report: {e}")
+            events.append(json.loads(line))
+        except ValueError:
+            continue
+    return events
 
-    threading.Thread(target=run_script).start()
+def encode_event(entry):
+    """One compact JSON-Lines record"""
+    return json.dumps(entry, separators=(",", ":")) + "\n"
 
-def trigger_weekly_report_update():
+def event_log_file(timestamp):
+    """Monthly log file an event at timestamp belongs to (by Kyiv date, like its date_str)"""
+    return EVENT_LOG_PATTERN.format(datetime.datetime.fromtimestamp(timestamp, KYIV_TZ).strftime("%Y-%m"))
+
+def event_log_files():
+    """Existing monthly log files, oldest first (YYYY-MM names sort chronologically)"""
+    return sorted(glob.glob(EVENT_LOG_GLOB))
+
+# Last (per-file lists, concatenation) handed out by read_events(); swapped as one tuple
+_events_cache = {"last": ((), [])}
+
+def read_events(min_events=None):
     """
-    Triggers the generation of the weekly report chart for the web.
+    Returns logged events, oldest first ([] if there is no log yet), from every
+    monthly file, or with min_events only from as many of the newest months as it
+    takes to hold that many. Each file is parsed once per version, and the same
+    list is returned until one of them changes.
     """
-    def run_script():
+    parts = []
+    count = 0
+    for path in reversed(event_log_files()):
+        if min_events is not None and count >= min_events:
+            break
         try:
-            print("Triggering weekly report update...")
-            python_exec = "/root/geminicli/light-monitor-kyiv/venv/bin/python"
-            script_path = "/root/geminicli/light-monitor-kyiv/generate_weekly_report.py"
-            output_path = "/root/geminicli/light-monitor-kyiv/web/weekly.png"
-            
-            subprocess.run([python_exec, script_path, "--output", output_path], check=True)
-        except Exception as e:
-            print(f"Failed to trigger weekly report: {e}")
+            part = load_cached(path, parse_event_lines)
+        except FileNotFoundError:
+            continue
+        parts.append(part)
+        count += len(part)
+    parts.reverse()
+    
+    cached_parts, events = _events_cache["last"]
+    if len(parts) != len(cached_parts) or any(a is not b for a, b in zip(parts, cached_parts)):
+        events = [e for part in parts for e in part]
+        _events_cache["last"] = (tuple(parts), events)
+    return events
+
+# Absolute paths based on the service file
+PYTHON_EXEC = "/root/geminicli/light-monitor-kyiv/venv/bin/python"
+PROJECT_DIR = "/root/geminicli/light-monitor-kyiv"
+
+# Warm report generator (report_worker.py): one long-lived interpreter with
+# matplotlib already imported, fed "daily"/"weekly" commands over its stdin.
+# It runs them in order, off the request/monitor threads. It is started on the
+# first trigger; if it can't be, reports fall back to one subprocess per run.
+REPORT_WORKER = f"{PROJECT_DIR}/report_worker.py"
+_report_proc = None
+_report_proc_lock = threading.Lock()
+
+# Event-log appends and report triggers are queued here so heartbeats and the
+# monitor loop never wait on disk. A single worker keeps them in order: the
+# event is logged before the report that charts it is triggered.
+_io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="io")
+
+# Telegram sends get their own worker: pacing and retry sleeps there never hold
+# up the event log behind them
+_telegram_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="telegram")
+
+# Fallback when the warm worker can't be used: one report subprocess per trigger, in order
+_report_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reports")
+
+def start_report_worker():
+    """(Re)starts the report worker process; returns False if it can't be launched. Call with _report_proc_lock held"""
+    global _report_proc
+    try:
+        _report_proc = subprocess.Popen([PYTHON_EXEC, "-u", REPORT_WORKER], stdin=subprocess.PIPE)
+        return True
+    except OSError as e:
+        print(f"Failed to start report worker: {e}")
+        _report_proc = None
+        return False
+
+def send_report_command(cmd):
+    """
+    Queues a command line for the report worker, starting it on first use and
+    restarting it if it has exited. Returns False if the worker is unavailable.
+    """
+    global _report_proc
+    with _report_proc_lock:
+        # Two attempts: the worker may die between poll() and the write
+        for _ in range(2):
+            try:
+                if _report_proc is None or _report_proc.poll() is not None:
+                    if not start_report_worker():
+                        return False
+                _report_proc.stdin.write(cmd)
+                _report_proc.stdin.flush()
+                return True
+            except OSError as e:
+                print(f"Report worker unavailable: {e}")
+                _report_proc = None
+    return False
+
+def run_daily_report():
+    try:
+        print("Triggering daily report update...")
+        # Run without --no-send so it updates Telegram
+        subprocess.run([PYTHON_EXEC, f"{PROJECT_DIR}/generate_daily_report.py"], check=True)
+        
+        # Also refresh the weekly chart, on the same worker right after
+        run_weekly_report()
+        
+    except Exception as e:
+        print(f"Failed to trigger daily report: {e}")
+
+def run_weekly_report():
+    try:
+        print("Triggering weekly report update...")
+        subprocess.run([PYTHON_EXEC, f"{PROJECT_DIR}/generate_weekly_report.py",
+                        "--output", f"{PROJECT_DIR}/web/weekly.png"], check=True)
+    except Exception as e:
+        print(f"Failed to trigger weekly report: {e}")
 
-    threading.Thread(target=run_script).start()
+def trigger_daily_report_update():
+    """
+    Queues the generation and update of the daily report chart (and then the weekly one).
+    Runs asynchronously to not block the main thread.
+    """
+    if not send_report_command(b"daily\n"):
+        _report_executor.submit(run_daily_report)
+
+def trigger_weekly_report_update():
+    """
+    Queues the generation of the weekly report chart for the web.
+    """
+    if not send_report_command(b"weekly\n"):
+        _report_executor.submit(run_weekly_report)
 
 def log_event(event_type, timestamp):
     """
-    Logs an event (up/down) to a JSON file for historical analysis.
+    Logs an event (up/down) for historical analysis as a single line appended to
+    its month's JSON-Lines file. Nothing is ever rewritten or trimmed; old months
+    simply stop growing.
     """
     try:
         entry = {
@@ -83,39 +293,50 @@ def log_event(event_type, timestamp):
             "event": event_type,
             "date_str": datetime.datetime.fromtimestamp(timestamp, KYIV_TZ).strftime("%Y-%m-%d %H:%M:%S")
         }
+        with open(event_log_file(timestamp), 'a') as f:
+            f.write(encode_event(entry))
+    except Exception as e:
+        print(f"Failed to log event: {e}")
+
+def migrate_event_log():
+    """
+    One-time split of the old JSON-array event_log.json into monthly files; it is
+    kept afterwards as event_log.json.bak. Safe to re-run after a crash part way:
+    each month file is replaced atomically, and events it already holds are skipped.
+    """
+    if not os.path.exists(LEGACY_EVENT_LOG_FILE):
+        return
+    try:
+        with open(LEGACY_EVENT_LOG_FILE, 'rb') as f:
+            content = f.read().strip()
+        events = json.loads(content) if content else []
+        if not isinstance(events, list):
+            events = []
         
-        # Read existing logs or create new list
-        logs = []
-        if os.path.exists(EVENT_LOG_FILE):
-            try:
-                with open(EVENT_LOG_FILE, 'r') as f:
-                    content = f.read().strip()
-                    if content:
-                        logs = json.loads(content)
-                        if not isinstance(logs, list):
-                            logs = []
-            except (json.JSONDecodeError, FileNotFoundError):
-                logs = []
-            
-        logs.append(entry)
+        by_month = {}
+        for e in events:
+            by_month.setdefault(event_log_file(e["timestamp"]), []).append(e)
+        for path, month_events in by_month.items():
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    existing = parse_event_lines(f.read())
+                seen = {(e.get("timestamp"), e.get("event")) for e in existing}
+                month_events = existing + [e for e in month_events if (e["timestamp"], e.get("event")) not in seen]
+                month_events.sort(key=lambda e: e["timestamp"])
+            write_atomic(path, "".join(map(encode_event, month_events)).encode("utf-8"))
         
-        # Keep roughly last ~30 days (assuming ~20 events/day max = 600 events)
-        if len(logs) > 1000: 
-            logs = logs[-1000:]
-            
-        with open(EVENT_LOG_FILE, 'w') as f:
-            json.dump(logs, f, indent=2)
-            
+        os.replace(LEGACY_EVENT_LOG_FILE, LEGACY_EVENT_LOG_FILE + ".bak")
+        print(f"Migrated {len(events)} events from {LEGACY_EVENT_LOG_FILE} into {len(by_month)} monthly files")
     except Exception as e:
-        print(f"Failed to log event: {e}")
+        print(f"Failed to migrate event log: {e}")
 
 def load_state():
     global state
     if os.path.exists(STATE_FILE):
         try:
-            with open(STATE_FILE, 'r') as f:
-                saved_state = json.load(f)
-                state.update(saved_state)
+            with open(STATE_FILE, 'rb') as f:
+                saved_state = json.loads(f.read())
+            state.update(saved_state)
         except Exception as e:
             print(f"Error loading state: {e}")
     
@@ -123,179 +344,286 @@ def load_state():
         state["secret_key"] = secrets.token_urlsafe(16)
         save_state()
 
-def save_state():
+def save_state(durable=True):
+    """
+    Atomically replaces STATE_FILE with the current state (write_atomic), so a crash
+    mid-write can never leave it truncated. durable=True also fsyncs; status
+    transitions use that, heartbeat-only updates skip it.
+    """
+    global _last_state_save
     with state_lock:
-        try:
-            with open(STATE_FILE, 'w') as f:
-                json.dump(state, f)
-        except Exception as e:
-            print(f"Error saving state: {e}")
+        snapshot = dict(state)
+    try:
+        # Encode up front: one write() instead of json.dump's stream of small ones
+        data = json.dumps(snapshot, separators=(",", ":")).encode("utf-8")
+        with _state_file_lock:
+            write_atomic(STATE_FILE, data, durable)
+            _last_state_save = time.monotonic()
+    except Exception as e:
+        print(f"Error saving state: {e}")
+
+def save_heartbeat_state():
+    """
+    Persists a heartbeat-only last_seen bump at most every STATE_SAVE_INTERVAL seconds.
+    A crash loses at most that much of last_seen, well inside the 180 s timeout.
+    """
+    if time.monotonic() - _last_state_save >= STATE_SAVE_INTERVAL:
+        save_state(durable=False)
+
+def flush_state():
+    """Writes the latest state on shutdown, including any throttled heartbeat"""
+    save_state()
+
+@lru_cache(maxsize=1)
+def format_clock(ts):
+    """Kyiv HH:MM:SS for a timestamp; the page re-renders the same last_seen many times"""
+    return datetime.datetime.fromtimestamp(ts, KYIV_TZ).strftime("%H:%M:%S")
 
 def get_current_time():
     # Returns local time timestamp
     return time.time()
 
 def format_duration(seconds):
-    h = int(seconds // 3600)
-    m = int((seconds % 3600) // 60)
-    return f"{h} год {m} хв"
+    # A negative span only comes from clock skew; don't render it as "-1 год 59 хв"
+    if seconds < 0:
+        return "невідомо"
+    h, rem = divmod(int(seconds), 3600)
+    return f"{h} год {rem // 60} хв"
 
 def get_schedule_context():
     try:
-        with open(SCHEDULE_FILE, 'r') as f:
-            data = json.load(f)
-        
-        source = data.get('yasno') or data.get('github')
-        if not source: return (None, None, "Невідомо", None)
-        
-        group_key = list(source.keys())[0]
-        schedule_data = source[group_key]
-        
+        # One wall-clock read; the date keys and slot index are plain integer/date math.
+        # The offset is DST-dependent, so it comes from ZoneInfo rather than a constant.
         now = datetime.datetime.now(KYIV_TZ)
-        today_str = now.strftime("%Y-%m-%d")
-        tomorrow_str = (now + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+        today = now.date()
+        today_str = today.isoformat()
+        tomorrow_str = (today + datetime.timedelta(days=1)).isoformat()
+        current_slot_idx = now.hour * 2 + now.minute // 30
         
-        if today_str not in schedule_data or not schedule_data[today_str].get('slots'):
-            return (None, None, "Графік відсутній", None)
+        return _schedule_context_cached(file_version(SCHEDULE_FILE), current_slot_idx, today_str, tomorrow_str)
             
-        # Combine today and tomorrow slots for a 48h view (96 slots)
-        slots = list(schedule_data[today_str]['slots'])
-        if tomorrow_str in schedule_data and schedule_data[tomorrow_str].get('slots'):
-            slots.extend(schedule_data[tomorrow_str]['slots'])
-        else:
-            # If no tomorrow data, pad with the last state of today
-            slots.extend([slots[-1]] * 48)
-            
-        current_slot_idx = (now.hour * 2) + (1 if now.minute >= 30 else 0)
+    except Exception as e:
+        print(f"Schedule error: {e}")
+        return (None, None, "Помилка", None)
+
+@lru_cache(maxsize=4)
+def _schedule_context_cached(version, current_slot_idx, today_str, tomorrow_str):
+    """
+    get_schedule_context() for one schedule file version and half-hour slot.
+    The answer only changes when the slot ticks over or the file is rewritten,
+    so the key is (file version, slot, today, tomorrow).
+    """
+    group = load_group_schedule()
+    if not group: return (None, None, "Невідомо", None)
+    
+    group_key, schedule_data, _ = group
+    
+    if today_str not in schedule_data or not schedule_data[today_str].get('slots'):
+        return (None, None, "Графік відсутній", None)
         
-        # True = Light, False = Outage
-        is_light_now = slots[current_slot_idx]
+    # Combine today and tomorrow slots for a 48h view (96 slots)
+    slots = list(schedule_data[today_str]['slots'])
+    if tomorrow_str in schedule_data and schedule_data[tomorrow_str].get('slots'):
+        slots.extend(schedule_data[tomorrow_str]['slots'])
+    else:
+        # If no tomorrow data, pad with the last state of today
+        slots.extend([slots[-1]] * 48)
         
-        # Find end of current block (max 96 slots)
+    # True = Light, False = Outage
+    is_light_now = slots[current_slot_idx]
+    
+    # Slots as 0/1 bytes, so block boundaries are found with bytes.find (memchr)
+    slot_bytes = bytes(map(bool, slots))
+    now_byte = b"\x01" if is_light_now else b"\x00"
+    other_byte = b"\x00" if is_light_now else b"\x01"
+    
+    # Find end of current block (max 96 slots)
+    end_idx = slot_bytes.find(other_byte, current_slot_idx + 1)
+    if end_idx < 0:
         end_idx = len(slots)
-        for i in range(current_slot_idx + 1, len(slots)):
-            if slots[i] != is_light_now:
-                end_idx = i
-                break
-        
-        # Format end time
-        def format_idx_to_time(idx):
-            if idx >= 96: return "час очікується"
-            day_offset = idx // 48
-            rem_idx = idx % 48
-            h = rem_idx // 2
-            m = 30 if rem_idx % 2 else 0
-            
-            if day_offset == 0:
-                return f"{h:02d}:{m:02d}"
-            elif day_offset == 1:
-                return f"завтра о {h:02d}:{m:02d}"
-            else:
-                return "післязавтра"
-
-        t_end = format_idx_to_time(end_idx)
-        
-        # Find next block range
-        next_start_idx = end_idx
-        next_duration = None
+    
+    # Format end time
+    def format_idx_to_time(idx):
+        if idx >= 96: return "час очікується"
+        day_offset = idx // 48
+        rem_idx = idx % 48
+        h = rem_idx // 2
+        m = 30 if rem_idx % 2 else 0
         
-        if next_start_idx < len(slots):
-            # If we need to show the range of the NEXT block
-            # But the next block is in tomorrow and tomorrow is empty/padded
-            if next_start_idx >= 48 and (tomorrow_str not in schedule_data or not schedule_data[tomorrow_str].get('slots')):
-                next_range = "час очікується"
-            else:
-                next_end_idx = len(slots)
-                for i in range(next_start_idx + 1, len(slots)):
-                    if slots[i] == is_light_now:
-                        next_end_idx = i
-                        break
-                
-                ns_t = format_idx_to_time(next_start_idx)
-                ne_t = format_idx_to_time(next_end_idx)
-                next_range = f"{ns_t} - {ne_t}"
-                
-                # Calculate duration
-                dur_h = (next_end_idx - next_start_idx) * 0.5
-                next_duration = f"{dur_h:g}".replace('.', ',')
+        if day_offset == 0:
+            return f"{h:02d}:{m:02d}"
+        elif day_offset == 1:
+            return f"завтра о {h:02d}:{m:02d}"
         else:
+            return "післязавтра"
+
+    t_end = format_idx_to_time(end_idx)
+    
+    # Find next block range
+    next_start_idx = end_idx
+    next_duration = None
+    
+    if next_start_idx < len(slots):
+        # If we need to show the range of the NEXT block
+        # But the next block is in tomorrow and tomorrow is empty/padded
+        if next_start_idx >= 48 and (tomorrow_str not in schedule_data or not schedule_data[tomorrow_str].get('slots')):
             next_range = "час очікується"
+        else:
+            next_end_idx = slot_bytes.find(now_byte, next_start_idx + 1)
+            if next_end_idx < 0:
+                next_end_idx = len(slots)
             
-        return (is_light_now, t_end, next_range, next_duration)
+            ns_t = format_idx_to_time(next_start_idx)
+            ne_t = format_idx_to_time(next_end_idx)
+            next_range = f"{ns_t} - {ne_t}"
             
-    except Exception as e:
-        print(f"Schedule error: {e}")
-        return (None, None, "Помилка", None)
+            # Calculate duration
+            dur_h = (next_end_idx - next_start_idx) * 0.5
+            next_duration = f"{dur_h:g}".replace('.', ',')
+    else:
+        next_range = "час очікується"
+        
+    return (is_light_now, t_end, next_range, next_duration)
 
 def send_telegram(message):
+    global _tg_last_send
     # Mask token for logging
     token_masked = TOKEN[:5] + "..." + TOKEN[-5:] if TOKEN else "None"
     print(f"DEBUG: Sending telegram message to {CHAT_ID} via bot {token_masked}")
     
-    url = f"https://api.telegram.org/bot{TOKEN}/sendMessage"
     payload = {
         "chat_id": CHAT_ID,
         "text": message,
         "parse_mode": "HTML"
     }
+    
+    # Runs on the single Telegram worker, so pacing here throttles every queued send
+    wait = _tg_last_send + TELEGRAM_MIN_INTERVAL - time.monotonic()
+    if wait > 0:
+        time.sleep(wait)
+    _tg_last_send = time.monotonic()
+    body = json.dumps(payload).encode("utf-8")
     try:
-        r = requests.post(url, json=payload, timeout=5)
-        print(f"DEBUG: Telegram Response: {r.status_code} {r.text}")
-        if r.status_code != 200:
-            print(f"Telegram API Error: {r.status_code} {r.text}")
+        for attempt in range(TELEGRAM_RETRIES + 1):
+            status, text = telegram_post(body)
+            print(f"DEBUG: Telegram Response: {status} {text}")
+            if status == 200:
+                return
+            print(f"Telegram API Error: {status} {text}")
+            if status not in TELEGRAM_RETRY_STATUSES or attempt == TELEGRAM_RETRIES:
+                return
+            time.sleep(telegram_retry_delay(status, text, attempt))
     except Exception as e:
         print(f"Failed to send Telegram message: {e}")
 
+def telegram_retry_delay(status, text, attempt):
+    """
+    Seconds to wait before a retry: Telegram's retry_after for 429, else exponential
+    backoff; never more than TELEGRAM_MAX_RETRY_DELAY
+    """
+    delay = 0.5 * 2 ** attempt
+    if status == 429:
+        try:
+            delay = float(json.loads(text)["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            pass
+    return min(delay, TELEGRAM_MAX_RETRY_DELAY)
+
+def telegram_post(body):
+    """
+    POSTs a sendMessage body over the kept-alive connection; returns (status, text).
+    If the server has dropped the idle connection, reconnects and retries once.
+    """
+    global _tg_conn
+    for attempt in range(2):
+        reused = _tg_conn is not None
+        if not reused:
+            _tg_conn = http.client.HTTPSConnection(TELEGRAM_HOST, timeout=5)
+        try:
+            _tg_conn.request("POST", TELEGRAM_SEND_PATH, body=body, headers=TG_HEADERS)
+            r = _tg_conn.getresponse()
+            return r.status, r.read().decode("utf-8", "replace")
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            _tg_conn.close()
+            _tg_conn = None
+            if not reused or attempt:
+                raise
+        except Exception:
+            _tg_conn.close()
+            _tg_conn = None
+            raise
+
+SLOT_MICROSECONDS = 30 * 60 * 1_000_000
+
+def day_microseconds(dt):
+    """Wall-clock time of day in integer microseconds, the unit timedelta works in"""
+    return ((dt.hour * 60 + dt.minute) * 60 + dt.second) * 1_000_000 + dt.microsecond
+
+def day_switches(slots):
+    """
+    A day's switch points as bitmasks: (all switches, switches into light,
+    switches into outage). Bit i is set when slot i starts a new state; slot 0
+    always counts as a switch into its own state.
+    """
+    n = len(slots)
+    bits = sum(1 << i for i, on in enumerate(slots) if on)
+    switches = ((bits ^ (bits << 1)) | 1) & ((1 << n) - 1)
+    return (switches, switches & bits, switches & ~bits)
+
+def nearest_switches(mask, slot):
+    """
+    Indices of the last set bit at or before slot and the first one after it,
+    in that order; only those two can be the switch nearest to a time in slot.
+    """
+    found = []
+    below = mask & ((2 << slot) - 1)
+    if below:
+        found.append(below.bit_length() - 1)
+    above = mask >> (slot + 1)
+    if above:
+        # Lowest set bit of above, shifted back to a slot index
+        found.append((above & -above).bit_length() + slot)
+    return found
+
 def get_deviation_info(event_time, is_up):
     # event_time: timestamp (float)
     # is_up: True if light appeared, False if disappeared
     
     try:
-        if not os.path.exists(SCHEDULE_FILE):
+        try:
+            group = load_group_schedule()
+        except FileNotFoundError:
             return ""
-            
-        with open(SCHEDULE_FILE, 'r') as f:
-            data = json.load(f)
         
         # Priority: Yasno -> Github
-        source = data.get('yasno') or data.get('github')
-        if not source: return ""
+        if not group: return ""
         
-        group_key = list(source.keys())[0]
-        schedule_data = source[group_key]
+        group_key, schedule_data, switches = group
         
         # Localize event time
         dt = datetime.datetime.fromtimestamp(event_time, KYIV_TZ)
-        date_str = dt.strftime("%Y-%m-%d")
+        date_str = dt.date().isoformat()
         
         if date_str not in schedule_data or not schedule_data[date_str].get('slots'):
             return ""
             
-        slots = schedule_data[date_str]['slots']
+        all_switches, up_switches, _ = switches[date_str]
         
         # Find nearest transition
         best_diff = 9999
         transition_type = None # 'up' or 'down'
         
-        for i in range(49):
-            state_before = slots[i-1] if i > 0 else slots[0] 
-            state_after = slots[i] if i < 48 else slots[47] 
-            
-            if i == 0: state_before = not state_after 
+        # Wall-clock microseconds since midnight; slot i switches at i * 30 min.
+        # Plain integers instead of a datetime per switch, same result.
+        cur_us = day_microseconds(dt)
+        
+        for i in nearest_switches(all_switches, cur_us // SLOT_MICROSECONDS):
+            is_up_switch = up_switches >> i & 1
+            diff = (cur_us - i * SLOT_MICROSECONDS) / 1_000_000 / 60
             
-            if state_before != state_after:
-                trans_h = i // 2
-                trans_m = 30 if i % 2 else 0
-                
-                trans_dt = dt.replace(hour=trans_h, minute=trans_m, second=0, microsecond=0)
-                diff = (dt - trans_dt).total_seconds() / 60
-                
-                if abs(diff) < abs(best_diff):
-                    best_diff = int(diff)
-                    if not state_before and state_after:
-                        transition_type = 'up'
-                    else:
-                        transition_type = 'down'
+            if abs(diff) < abs(best_diff):
+                best_diff = int(diff)
+                transition_type = 'up' if is_up_switch else 'down'
 
         if abs(best_diff) > 90:
             return ""
@@ -324,46 +652,31 @@ def get_nearest_schedule_switch(event_time, target_is_up):
     Returns: Formatted time string "HH:MM" or None.
     """
     try:
-        if not os.path.exists(SCHEDULE_FILE): return None
-        with open(SCHEDULE_FILE, 'r') as f: data = json.load(f)
+        try: group = load_group_schedule()
+        except FileNotFoundError: return None
         
-        source = data.get('yasno') or data.get('github')
-        if not source: return None
+        if not group: return None
         
-        group_key = list(source.keys())[0]
-        schedule_data = source[group_key]
+        group_key, schedule_data, switches = group
         
         dt = datetime.datetime.fromtimestamp(event_time, KYIV_TZ)
-        date_str = dt.strftime("%Y-%m-%d")
+        date_str = dt.date().isoformat()
         
         if date_str not in schedule_data or not schedule_data[date_str].get('slots'):
             return None
             
-        slots = schedule_data[date_str]['slots']
+        # Switches into the target state only; the nearest is either side of now
+        mask = switches[date_str][1 if target_is_up else 2]
         
         best_diff = 9999
         best_time_str = None
+        cur_us = day_microseconds(dt)
         
-        for i in range(49):
-            state_before = slots[i-1] if i > 0 else slots[0]
-            state_after = slots[i] if i < 48 else slots[47]
-            if i == 0: state_before = not state_after
-            
-            if state_before != state_after:
-                # Check if this transition matches our target
-                # OFF->ON (Up) is state_after=True
-                # ON->OFF (Down) is state_after=False
-                is_up_switch = state_after
-                
-                if is_up_switch == target_is_up:
-                    trans_h = i // 2
-                    trans_m = 30 if i % 2 else 0
-                    trans_dt = dt.replace(hour=trans_h, minute=trans_m, second=0, microsecond=0)
-                    
-                    diff = abs((dt - trans_dt).total_seconds())
-                    if diff < best_diff:
-                        best_diff = diff
-                        best_time_str = f"{trans_h:02d}:{trans_m:02d}"
+        for i in nearest_switches(mask, cur_us // SLOT_MICROSECONDS):
+            diff = abs(cur_us - i * SLOT_MICROSECONDS) / 1_000_000
+            if diff < best_diff:
+                best_diff = diff
+                best_time_str = f"{i // 2:02d}:{30 if i % 2 else 0:02d}"
                         
         if best_diff > 5400: # If closest is more than 1.5 hours away, ignore
             return None
@@ -372,558 +685,839 @@ def get_nearest_schedule_switch(event_time, target_is_up):
     except:
         return None
 
-# --- Heartbeat Handler ---
-class RequestHandler(http.server.SimpleHTTPRequestHandler):
-    def do_GET(self):
-        parsed = urlparse(self.path)
+# Wording of the two transition notifications, keyed by came_up:
+# (header, duration label, scheduled switch label, next switch label)
+TRANSITION_TEXT = {
+    True: ("🟢 <b>{} Світло з'явилося</b>", "Світла не було",
+           "За графіком світло мало з'явитися о", "Наступне вимкнення"),
+    False: ("🔴 <b>{} Світло зникло!</b>", "Світло було",
+            "За графіком світло мало зникнути о", "Очікуємо увімкнення"),
+}
+
+def build_transition_message(came_up, event_ts, since, now, brief=False):
+    """
+    Telegram text for a status change at event_ts. since is when the previous
+    state began (0 if unknown) and now is when the change was detected.
+    brief=True gives the short note for an outage that was never announced.
+    """
+    duration = format_duration(event_ts - since) if since > 0 else "невідомо"
+    time_str = datetime.datetime.fromtimestamp(event_ts, KYIV_TZ).strftime("%H:%M")
+    if brief:
+        return f"⚡ <b>{time_str} Світло ненадовго зникало</b>\n\n• Світла не було: <b>{duration}</b>"
+    
+    header, duration_label, scheduled_label, next_label = TRANSITION_TEXT[came_up]
+    sched_light_now, current_end, next_range, next_duration = get_schedule_context()
+    dev_msg = get_deviation_info(now, came_up)
+    
+    # Header
+    msg = header.format(time_str) + "\n\n"
+    
+    # Stats Block
+    msg += "📊 <b>Статистика відключення:</b>\n"
+    msg += f"• {duration_label}: <b>{duration}</b>\n"
+    if dev_msg:
+        msg += f"{dev_msg}\n"
+    
+    # Schedule Block
+    msg += "\n🗓 <b>Аналіз:</b>\n"
+    
+    scheduled_time = get_nearest_schedule_switch(event_ts, came_up)
+    if scheduled_time:
+        msg += f"• {scheduled_label}: <b>{scheduled_time}</b>\n"
+    
+    # If the schedule is already in the opposite state, the next switch is the end of the following block
+    if sched_light_now is (not came_up):
+        next_time = next_range.split(' - ')[1] if ' - ' in next_range else "час очікується"
+    else:
+        next_time = current_end
+    msg += f"• {next_label}: <b>{next_time}</b>"
+    return msg
+
+# Rendered "recent events" card, rebuilt only when the parsed event log changes
+_history_cache = {"logs": None, "html": ""}
+
+def render_history_html():
+    """
+    Returns the status page's "recent events" card for the last 10 events, newest first.
+    read_events() hands back the same list until the log changes, so the rows
+    (and each event's time since the previous one) are built once per log change.
+    """
+    # 10 rows, plus the event before the oldest one for its duration
+    logs = read_events(min_events=11)
+    if not logs:
+        return ""
+    if logs is _history_cache["logs"]:
+        return _history_cache["html"]
+    
+    # Last 10 events, reversed; each paired with the one before it
+    # to get the time since the previous event
+    start = max(len(logs) - 10, 0)
+    
+    rows = ""
+    for i in range(len(logs) - 1, start - 1, -1):
+        log = logs[i]
+        ts = log.get('timestamp', 0)
+        evt = log.get('event', 'unknown')
+        dur_sec = log['timestamp'] - logs[i-1]['timestamp'] if i > 0 else None
         
-        # 1. Status Page (Root)
-        if parsed.path == "/":
-            self.send_response(200)
-            self.send_header("Content-type", "text/html; charset=utf-8")
-            self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
-            self.send_header("Pragma", "no-cache")
-            self.send_header("Expires", "0")
-            self.end_headers()
-            
-            with state_lock:
-                status_color = "#4CAF50" if state["status"] == "up" else "#EF9A9A"
-                status_text = "СВІТЛО Є" if state["status"] == "up" else "СВІТЛА НЕМАЄ"
-                last_event_ts = state["came_up_at"] if state["status"] == "up" else state["went_down_at"]
-                
-                duration = "?"
-                if last_event_ts > 0:
-                    duration = format_duration(time.time() - last_event_ts)
-                
-                last_ping = "ніколи"
-                if state["last_seen"] > 0:
-                    last_ping = datetime.datetime.fromtimestamp(state["last_seen"], KYIV_TZ).strftime("%H:%M:%S")
-
-            # Get Group Name
-            group_name = "Невідома група"
+        # date_str is stored by log_event as "YYYY-MM-DD HH:MM:SS" Kyiv time
+        d = log.get('date_str')
+        if d and len(d) >= 16:
+            dt_str = f"{d[8:10]}.{d[5:7]} {d[11:16]}"
+        else:
+            dt_str = datetime.datetime.fromtimestamp(ts, KYIV_TZ).strftime("%d.%m %H:%M")
+        
+        color = "#4CAF50" if evt == "up" else "#EF9A9A"
+        icon = "🟢" if evt == "up" else "🔴"
+        
+        if evt == "up":
+            base_text = "Світло з'явилося"
+            if dur_sec:
+                dur_str = format_duration(dur_sec)
+                text = f"{base_text}<br><span style=\'font-weight:normal; font-size: 0.9em; color: #AAA; text-align: right; display: block;\'>(не було {dur_str})</span>"
+            else:
+                text = base_text
+        else:
+            base_text = "Світло зникло"
+            if dur_sec:
+                dur_str = format_duration(dur_sec)
+                text = f"{base_text}<br><span style=\'font-weight:normal; font-size: 0.9em; color: #AAA; text-align: right; display: block;\'>(було {dur_str})</span>"
+            else:
+                text = base_text
+        
+        rows += f"""
+        <tr>
+            <td style="white-space: nowrap; text-align: left;">{dt_str}</td>
+            <td style="color: {color}; font-weight: bold; text-align: left;">{icon} {text}</td>
+        </tr>
+        """
+    
+    html = f"""
+    <div class="card">
+        <div class="title">Останні події</div>
+        <table>
+            {rows}
+        </table>
+    </div>
+    """
+    
+    _history_cache["logs"] = logs
+    _history_cache["html"] = html
+    return html
+
+# Status page skeleton, built once; do_GET only fills in the placeholders.
+# Literal CSS/JS braces are doubled for str.format_map.
+STATUS_PAGE_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Монітор живлення</title>
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <meta name="robots" content="noindex, nofollow">
+    <meta http-equiv="refresh" content="60">
+
+    <!-- PWA Settings -->
+    <link rel="manifest" href="/manifest.json">
+    <meta name="theme-color" content="#1E122A">
+    <link rel="icon" type="image/svg+xml" href="/icon.svg">
+    <link rel="apple-touch-icon" href="/icon.svg">
+    <meta name="apple-mobile-web-app-status-bar-style" content="black-translucent">
+
+    <style>
+        body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif; background: #1E122A; color: white; text-align: center; padding: 20px; margin: 0; }}
+        .container {{ max-width: 800px; margin: 0 auto; }}
+
+        h1 {{
+            font-weight: 500;
+            letter-spacing: 0.5px;
+            color: #E0E0E0;
+            margin-bottom: 30px;
+        }}
+
+        .card {{ 
+            background: #1E122A; 
+            border-radius: 12px; 
+            padding: 20px; 
+            margin-bottom: 20px; 
+            box-shadow: 0 5px 15px rgba(0,0,0,0.3);
+            text-align: left;
+            border: 1px solid #1E122A; /* Reverted border color */
+        }}
+
+        .title {{ color: #aaa; font-size: 14px; text-transform: uppercase; letter-spacing: 1px; margin-bottom: 10px; font-weight: 600; }}
+        .value {{ font-size: 28px; font-weight: bold; }}
+        .status-text {{ font-size: 16px; margin-top: 5px; color: #ccc; }}
+
+        .status-card .value {{ font-size: 36px; text-align: center; }}
+        .status-card .status-text {{ text-align: center; }}
+
+        .chart {{ width: 100%; border-radius: 8px; margin-top: 10px; }}
+
+        .group {{ text-align: center; margin-top: -10px; margin-bottom: 20px; font-size: 16px; color: #BBB; font-weight: bold; }}
+
+        .footer {{ margin-top: 40px; font-size: 12px; color: #666; text-align: center;}}
+        .footer a {{ color: #888; text-decoration: none; }}
+        .footer a:hover {{ color: #fff; text-decoration: underline; }}
+
+        /* Table Styles */
+        table {{ width: 100%; border-collapse: collapse; margin-top: 10px; }}
+        td {{ padding: 10px 8px; border-bottom: 1px solid #3a2d4d; }}
+        tr:last-child td {{ border-bottom: none; }}
+
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1 style="display: flex; align-items: center; justify-content: center; gap: 10px;">
+        Монітор живлення
+        <span id="audio-toggle" style="cursor:pointer; font-size:24px; opacity:0.5;" title="Увімкнути звукові сповіщення">🔕</span>
+    </h1>
+
+        <div class="card status-card">
+            <div class="title" style="text-align: center;">Поточний статус</div>
+            <div class="value" style="color: {status_color};">{status_text}</div>
+            <div class="status-text">
+                Тривалість: <b>{duration}</b><br>Останній сигнал: <b>{last_ping}</b>
+            </div>
+        </div>
+
+        <div class="card">
+            <div class="title">Графік за сьогодні ({group_name})</div>
+            <img src="/chart.png?v={chart_version}" class="chart" alt="Графік за сьогодні">
+        </div>
+
+        {analytics_html}
+
+        {weekly_chart_html}
+
+        {history_html}
+
+        <div class="footer">
+            Оновлено: {page_updated}<br>
+            © 2026 <a href="https://github.com/weby-homelab/light-monitor-kyiv" target="_blank" style="color: inherit; text-decoration: none;">Weby Homelab</a>. Made with ❤️ in Kyiv under air raid sirens and blackouts
+        </div>
+    </div>
+    <script>
+
+        let lastStatus = null;
+        let audioCtx = null;
+        let audioEnabled = localStorage.getItem('audioEnabled') === 'true';
+
+        const audioToggle = document.getElementById('audio-toggle');
+        if (audioEnabled) {{
+            audioToggle.innerText = "🔔";
+            audioToggle.style.opacity = "1";
+        }}
+        audioToggle.addEventListener('click', function() {{
+            if (!audioCtx) {{
+                audioCtx = new (window.AudioContext || window.webkitAudioContext)();
+            }}
+            if (audioCtx.state === 'suspended') {{
+                audioCtx.resume();
+            }}
+            audioEnabled = !audioEnabled;
+            localStorage.setItem('audioEnabled', audioEnabled);
+            this.innerText = audioEnabled ? "🔔" : "🔕";
+            this.style.opacity = audioEnabled ? "1" : "0.5";
+
+            if (audioEnabled && "Notification" in window) {{
+                if (Notification.permission !== "granted" && Notification.permission !== "denied") {{
+                    Notification.requestPermission();
+                }}
+            }}
+
+            if (audioEnabled) {{
+                playDing();
+            }}
+        }});
+
+        function playDing() {{
+            if (!audioCtx || !audioEnabled) return;
+            if (audioCtx.state === 'suspended') audioCtx.resume();
+
+            const osc = audioCtx.createOscillator();
+            const gainNode = audioCtx.createGain();
+
+            osc.type = 'sine';
+            osc.frequency.setValueAtTime(880, audioCtx.currentTime);
+            osc.frequency.exponentialRampToValueAtTime(440, audioCtx.currentTime + 0.5);
+
+            gainNode.gain.setValueAtTime(0.02, audioCtx.currentTime);
+            gainNode.gain.exponentialRampToValueAtTime(0.0001, audioCtx.currentTime + 0.5);
+
+            osc.connect(gainNode);
+            gainNode.connect(audioCtx.destination);
+
+            osc.start();
+            osc.stop(audioCtx.currentTime + 0.5);
+        }}
+
+        function showToast(title, body, type) {{
+            const container = document.getElementById('toast-container');
+            if (!container) return;
+
+            const toast = document.createElement('div');
+            toast.className = 'toast ' + (type === 'down' ? 'down' : 'up');
+
+            const icon = type === 'up' ? '💡' : '🔴';
+
+            toast.innerHTML = `
+                <div class="toast-title"><span class="toast-icon">${{icon}}</span> ${{title}}</div>
+                <div>${{body}}</div>
+            `;
+
+            container.appendChild(toast);
+
+            void toast.offsetWidth;
+            toast.classList.add('show');
+
+            setTimeout(() => {{
+                toast.classList.remove('show');
+                setTimeout(() => toast.remove(), 300);
+            }}, 5000);
+        }}
+
+        function showNotification(title, body) {{
+            if (audioEnabled && "Notification" in window && Notification.permission === "granted") {{
+                new Notification(title, {{
+                    body: body,
+                    icon: "/icon.svg",
+                    vibrate: [100, 50, 100]
+                }});
+            }}
+        }}
+
+        function checkStatus() {{
+            const statusVal = document.querySelector('.status-card .value').innerText;
+            const currentStatus = statusVal.includes('СВІТЛО Є') ? 'up' : 'down';
+
+            if (lastStatus && currentStatus !== lastStatus) {{
+                playDing();
+                if (currentStatus === 'up') {{
+                    showNotification("💡 Світло з'явилося!", "Електропостачання відновлено.");
+                    showToast("Світло з'явилося!", "Електропостачання відновлено.", 'up');
+                }} else {{
+                    showNotification("🔴 Світло зникло!", "Зафіксовано відключення.");
+                    showToast("Світло зникло!", "Зафіксовано відключення.", 'down');
+                }}
+            }}
+            lastStatus = currentStatus;
+        }}
+
+        setInterval(checkStatus, 5000);
+        setTimeout(checkStatus, 2000);
+
+        if ('serviceWorker' in navigator) {{
+            window.addEventListener('load', () => {{
+                navigator.serviceWorker.register('/service-worker.js')
+                    .then(reg => console.log('SW registered!', reg))
+                    .catch(err => console.log('SW failed!', err));
+            }});
+        }}
+
+    </script>
+</body>
+</html>
+"""
+
+NO_CACHE_HEADERS = (
+    ("Cache-Control", "no-cache, no-store, must-revalidate"),
+    ("Pragma", "no-cache"),
+    ("Expires", "0"),
+)
+
+# Small static files kept in memory: path -> (st_mtime_ns, st_size, bytes)
+STATIC_CACHE_MAX = 64 * 1024
+_static_cache = {}
+
+# PWA files never change while the server runs: URL path -> (content type, file)
+PWA_FILES = {
+    "/manifest.json": ("application/json", "web/manifest.json"),
+    "/icon.svg": ("image/svg+xml", "web/icon.svg"),
+    "/service-worker.js": ("text/javascript", "web/service-worker.js"),
+}
+
+def load_pwa_assets():
+    """
+    Reads the PWA files once: URL path -> (content type, bytes, mtime, Last-Modified).
+    Files missing at startup are left out and answered with 404.
+    """
+    assets = {}
+    for path, (content_type, file_path) in PWA_FILES.items():
+        try:
+            with open(file_path, "rb") as f:
+                body = f.read()
+                mtime = os.fstat(f.fileno()).st_mtime
+        except OSError:
+            continue
+        assets[path] = (content_type, body, mtime, email.utils.formatdate(mtime, usegmt=True))
+    return assets
+
+PWA_ASSETS = load_pwa_assets()
+
+# Reply to every push; the same bytes each time
+PUSH_OK_BODY = b'{"status": "ok", "msg": "heartbeat_received"}'
+PUSH_OK_LENGTH = str(len(PUSH_OK_BODY))
+
+# --- Heartbeat Handler ---
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    # Socket timeout, so a stalled client cannot pin one of the pooled workers
+    timeout = 30
+    # Buffer the response: status line, headers and a small body leave in one
+    # send() when the handler finishes, instead of one per write
+    wbufsize = 64 * 1024
+
+    def send_body(self, code, content_type, body, headers=()):
+        """Sends a complete response whose body is already in memory, with Content-Length"""
+        self.send_response(code)
+        self.send_header("Content-type", content_type)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_not_found(self):
+        """Bare 404 with an explicit empty body"""
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def not_modified(self, mtime):
+        """Answers 304 and returns True if the client's If-Modified-Since copy is current"""
+        since = self.headers.get("If-Modified-Since")
+        if since:
             try:
-                if os.path.exists(SCHEDULE_FILE):
-                    with open(SCHEDULE_FILE, 'r') as f:
-                        sched_data = json.load(f)
-                        src = sched_data.get('yasno') or sched_data.get('github')
-                        if src:
-                            group_key = list(src.keys())[0]
-                            group_name = group_key.replace("GPV", "Група ")
-            except:
+                if int(mtime) <= email.utils.parsedate_to_datetime(since).timestamp():
+                    self.send_response(304)
+                    self.end_headers()
+                    return True
+            except (TypeError, ValueError):
                 pass
+        return False
 
-            # Get Analytics & History
-            analytics_html = ""
-            history_html = ""
-            weekly_chart_html = ""
+    def send_static(self, file_path, content_type, headers=()):
+        """
+        Serves a file with Content-Length and Last-Modified, answering 304 when the
+        client's copy is current. Small files come from memory, larger ones go out
+        via sendfile(). Returns False if the file does not exist.
+        """
+        try:
+            f = open(file_path, "rb")
+        except FileNotFoundError:
+            return False
+        
+        with f:
+            st = os.fstat(f.fileno())
             
-            page_updated = datetime.datetime.now(KYIV_TZ).strftime("%d.%m.%Y %H:%M:%S")
+            if self.not_modified(st.st_mtime):
+                return True
             
-            # --- Weekly Chart ---
-            weekly_chart_path = "web/weekly.png"
-            if os.path.exists(weekly_chart_path):
-                 weekly_chart_html = """
-                 <div class="card">
-                     <div class="title">Тижневий графік</div>
-                     <img src="/weekly.png" class="chart" alt="Тижневий графік">
-                 </div>
-                 """
+            body = None
+            if st.st_size <= STATIC_CACHE_MAX:
+                cached = _static_cache.get(file_path)
+                if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                    body = cached[2]
+                else:
+                    body = f.read()
+                    _static_cache[file_path] = (st.st_mtime_ns, st.st_size, body)
             
-            # --- Event History ---
-            try:
-                if os.path.exists(EVENT_LOG_FILE):
-                    with open(EVENT_LOG_FILE, 'r') as f:
-                        logs = json.load(f)
-                        
-                        # Calculate durations
-                        for i in range(len(logs)):
-                            if i > 0:
-                                diff = logs[i]['timestamp'] - logs[i-1]['timestamp']
-                                logs[i]['duration_prev'] = diff
-                            else:
-                                logs[i]['duration_prev'] = None
-
-                        # Last 10 events, reversed
-                        last_logs = logs[-10:][::-1]
-                        
-                        rows = ""
-                        for log in last_logs:
-                            ts = log.get('timestamp', 0)
-                            evt = log.get('event', 'unknown')
-                            dur_sec = log.get('duration_prev')
-                            
-                            dt_str = datetime.datetime.fromtimestamp(ts, KYIV_TZ).strftime("%d.%m %H:%M")
-                            
-                            color = "#4CAF50" if evt == "up" else "#EF9A9A"
-                            icon = "🟢" if evt == "up" else "🔴"
-                            
-                            if evt == "up":
-                                base_text = "Світло з'явилося"
-                                if dur_sec:
-                                    dur_str = format_duration(dur_sec)
-                                    text = f"{base_text}<br><span style=\'font-weight:normal; font-size: 0.9em; color: #AAA; text-align: right; display: block;\'>(не було {dur_str})</span>"
-                                else:
-                                    text = base_text
-                            else:
-                                base_text = "Світло зникло"
-                                if dur_sec:
-                                    dur_str = format_duration(dur_sec)
-                                    text = f"{base_text}<br><span style=\'font-weight:normal; font-size: 0.9em; color: #AAA; text-align: right; display: block;\'>(було {dur_str})</span>"
-                                else:
-                                    text = base_text
-                            
-                            rows += f"""
-                            <tr>
-                                <td style="white-space: nowrap; text-align: left;">{dt_str}</td>
-                                <td style="color: {color}; font-weight: bold; text-align: left;">{icon} {text}</td>
-                            </tr>
-                            """
-                        
-                        history_html = f"""
-                        <div class="card">
-                            <div class="title">Останні події</div>
-                            <table>
-                                {rows}
-                            </table>
-                        </div>
-                        """
-            except Exception as e:
-                print(f"Error reading history: {e}")
+            self.send_response(200)
+            self.send_header("Content-type", content_type)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(st.st_size if body is None else len(body)))
+            self.send_header("Last-Modified", email.utils.formatdate(st.st_mtime, usegmt=True))
+            self.end_headers()
+            
+            if body is not None:
+                self.wfile.write(body)
+            else:
+                # Headers are still in the write buffer; they must go out first
+                self.wfile.flush()
+                self.connection.sendfile(f)
+        return True
 
-            try:
-                stats_file = "web/stats.json"
-                if os.path.exists(stats_file):
-                    with open(stats_file, 'r') as f:
-                        s = json.load(f)
-                        sign = "+" if s['diff'] > 0 else ""
-                        diff_str = f"{sign}{s['diff']:.1f}год"
-                        
-                        analytics_html = f"""
-                        <div class="card">
-                            <div class="title">План vs Факт (Сьогодні)</div>
-                            <div style="font-size: 16px; margin-bottom: 5px; color: #CCC;">• За планом: <b style="color: #fff;">{s['plan_up']}</b></div>
-                            <div style="font-size: 16px; margin-bottom: 5px; color: #CCC;">• Реально: <b style="color: #fff;">{s['fact_up']}</b></div>
-                            <div style="font-size: 16px; color: #CCC;">• Відхилення: <b style="color: #fff;">{diff_str}</b> ({s['pct']}% від плану)</div>
-                        </div>
-                        """
-            except Exception as e:
-                print(f"Error reading stats: {e}")
-
-            html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <title>Монітор живлення</title>
-                <meta name="viewport" content="width=device-width, initial-scale=1">
-                <meta name="robots" content="noindex, nofollow">
-                <meta http-equiv="refresh" content="60">
-                
-                <!-- PWA Settings -->
-                <link rel="manifest" href="/manifest.json">
-                <meta name="theme-color" content="#1E122A">
-                <link rel="icon" type="image/svg+xml" href="/icon.svg">
-                <link rel="apple-touch-icon" href="/icon.svg">
-                <meta name="apple-mobile-web-app-status-bar-style" content="black-translucent">
-
-                <style>
-                    body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif; background: #1E122A; color: white; text-align: center; padding: 20px; margin: 0; }}
-                    .container {{ max-width: 800px; margin: 0 auto; }}
-                    
-                    h1 {{
-                        font-weight: 500;
-                        letter-spacing: 0.5px;
-                        color: #E0E0E0;
-                        margin-bottom: 30px;
-                    }}
-
-                    .card {{ 
-                        background: #1E122A; 
-                        border-radius: 12px; 
-                        padding: 20px; 
-                        margin-bottom: 20px; 
-                        box-shadow: 0 5px 15px rgba(0,0,0,0.3);
-                        text-align: left;
-                        border: 1px solid #1E122A; /* Reverted border color */
-                    }}
-                    
-                    .title {{ color: #aaa; font-size: 14px; text-transform: uppercase; letter-spacing: 1px; margin-bottom: 10px; font-weight: 600; }}
-                    .value {{ font-size: 28px; font-weight: bold; }}
-                    .status-text {{ font-size: 16px; margin-top: 5px; color: #ccc; }}
-                    
-                    .status-card .value {{ font-size: 36px; text-align: center; }}
-                    .status-card .status-text {{ text-align: center; }}
-                    
-                    .chart {{ width: 100%; border-radius: 8px; margin-top: 10px; }}
-                    
-                    .group {{ text-align: center; margin-top: -10px; margin-bottom: 20px; font-size: 16px; color: #BBB; font-weight: bold; }}
-
-                    .footer {{ margin-top: 40px; font-size: 12px; color: #666; text-align: center;}}
-                    .footer a {{ color: #888; text-decoration: none; }}
-                    .footer a:hover {{ color: #fff; text-decoration: underline; }}
-                    
-                    /* Table Styles */
-                    table {{ width: 100%; border-collapse: collapse; margin-top: 10px; }}
-                    td {{ padding: 10px 8px; border-bottom: 1px solid #3a2d4d; }}
-                    tr:last-child td {{ border-bottom: none; }}
-
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <h1 style="display: flex; align-items: center; justify-content: center; gap: 10px;">
-                    Монітор живлення
-                    <span id="audio-toggle" style="cursor:pointer; font-size:24px; opacity:0.5;" title="Увімкнути звукові сповіщення">🔕</span>
-                </h1>
-                    
-                    <div class="card status-card">
-                        <div class="title" style="text-align: center;">Поточний статус</div>
-                        <div class="value" style="color: {status_color};">{status_text}</div>
-                        <div class="status-text">
-                            Тривалість: <b>{duration}</b><br>Останній сигнал: <b>{last_ping}</b>
-                        </div>
-                    </div>
-                    
-                    <div class="card">
-                        <div class="title">Графік за сьогодні ({group_name})</div>
-                        <img src="/chart.png?v={int(time.time())}" class="chart" alt="Графік за сьогодні">
-                    </div>
-                    
-                    {analytics_html}
-                    
-                    {weekly_chart_html}
-                    
-                    {history_html}
-                    
-                    <div class="footer">
-                        Оновлено: {page_updated}<br>
-                        © 2026 <a href="https://github.com/weby-homelab/light-monitor-kyiv" target="_blank" style="color: inherit; text-decoration: none;">Weby Homelab</a>. Made with ❤️ in Kyiv under air raid sirens and blackouts
-                    </div>
+    def serve_status(self, path):
+        """Status page (root)"""
+        # Hold the lock only long enough to copy the fields; format outside it
+        with state_lock:
+            snap = dict(state)
+
+        status_color = "#4CAF50" if snap["status"] == "up" else "#EF9A9A"
+        status_text = "СВІТЛО Є" if snap["status"] == "up" else "СВІТЛА НЕМАЄ"
+        last_event_ts = snap["came_up_at"] if snap["status"] == "up" else snap["went_down_at"]
+
+        duration = "?"
+        if last_event_ts > 0:
+            duration = format_duration(time.time() - last_event_ts)
+
+        last_ping = "ніколи"
+        if snap["last_seen"] > 0:
+            last_ping = format_clock(snap["last_seen"])
+
+        # Get Group Name
+        group_name = "Невідома група"
+        try:
+            group = load_group_schedule()
+            if group:
+                group_key = group[0]
+                group_name = group_key.replace("GPV", "Група ")
+        except:
+            pass
+
+        # Get Analytics & History
+        analytics_html = ""
+        history_html = ""
+        weekly_chart_html = ""
+
+        page_updated = datetime.datetime.now(KYIV_TZ).strftime("%d.%m.%Y %H:%M:%S")
+
+        # --- Weekly Chart ---
+        weekly_chart_path = "web/weekly.png"
+        if os.path.exists(weekly_chart_path):
+             weekly_chart_html = """
+             <div class="card">
+                 <div class="title">Тижневий графік</div>
+                 <img src="/weekly.png" class="chart" alt="Тижневий графік">
+             </div>
+             """
+
+        # --- Event History ---
+        try:
+            history_html = render_history_html()
+        except Exception as e:
+            print(f"Error reading history: {e}")
+
+        try:
+            stats_file = "web/stats.json"
+            if os.path.exists(stats_file):
+                s = load_json_cached(stats_file)
+                sign = "+" if s['diff'] > 0 else ""
+                diff_str = f"{sign}{s['diff']:.1f}год"
+
+                analytics_html = f"""
+                <div class="card">
+                    <div class="title">План vs Факт (Сьогодні)</div>
+                    <div style="font-size: 16px; margin-bottom: 5px; color: #CCC;">• За планом: <b style="color: #fff;">{s['plan_up']}</b></div>
+                    <div style="font-size: 16px; margin-bottom: 5px; color: #CCC;">• Реально: <b style="color: #fff;">{s['fact_up']}</b></div>
+                    <div style="font-size: 16px; color: #CCC;">• Відхилення: <b style="color: #fff;">{diff_str}</b> ({s['pct']}% від плану)</div>
                 </div>
-                <script>
-
-                    let lastStatus = null;
-                    let audioCtx = null;
-                    let audioEnabled = localStorage.getItem('audioEnabled') === 'true';
-
-                    const audioToggle = document.getElementById('audio-toggle');
-                    if (audioEnabled) {{
-                        audioToggle.innerText = "🔔";
-                        audioToggle.style.opacity = "1";
-                    }}
-                    audioToggle.addEventListener('click', function() {{
-                        if (!audioCtx) {{
-                            audioCtx = new (window.AudioContext || window.webkitAudioContext)();
-                        }}
-                        if (audioCtx.state === 'suspended') {{
-                            audioCtx.resume();
-                        }}
-                        audioEnabled = !audioEnabled;
-                        localStorage.setItem('audioEnabled', audioEnabled);
-                        this.innerText = audioEnabled ? "🔔" : "🔕";
-                        this.style.opacity = audioEnabled ? "1" : "0.5";
-                        
-                        if (audioEnabled && "Notification" in window) {{
-                            if (Notification.permission !== "granted" && Notification.permission !== "denied") {{
-                                Notification.requestPermission();
-                            }}
-                        }}
-                        
-                        if (audioEnabled) {{
-                            playDing();
-                        }}
-                    }});
-
-                    function playDing() {{
-                        if (!audioCtx || !audioEnabled) return;
-                        if (audioCtx.state === 'suspended') audioCtx.resume();
-                        
-                        const osc = audioCtx.createOscillator();
-                        const gainNode = audioCtx.createGain();
-                        
-                        osc.type = 'sine';
-                        osc.frequency.setValueAtTime(880, audioCtx.currentTime);
-                        osc.frequency.exponentialRampToValueAtTime(440, audioCtx.currentTime + 0.5);
-                        
-                        gainNode.gain.setValueAtTime(0.02, audioCtx.currentTime);
-                        gainNode.gain.exponentialRampToValueAtTime(0.0001, audioCtx.currentTime + 0.5);
-                        
-                        osc.connect(gainNode);
-                        gainNode.connect(audioCtx.destination);
-                        
-                        osc.start();
-                        osc.stop(audioCtx.currentTime + 0.5);
-                    }}
+                """
+        except Exception as e:
+            print(f"Error reading stats: {e}")
 
-                    function showToast(title, body, type) {{
-                        const container = document.getElementById('toast-container');
-                        if (!container) return;
-                        
-                        const toast = document.createElement('div');
-                        toast.className = 'toast ' + (type === 'down' ? 'down' : 'up');
-                        
-                        const icon = type === 'up' ? '💡' : '🔴';
-                        
-                        toast.innerHTML = `
-                            <div class="toast-title"><span class="toast-icon">${{icon}}</span> ${{title}}</div>
-                            <div>${{body}}</div>
-                        `;
-                        
-                        container.appendChild(toast);
-                        
-                        void toast.offsetWidth;
-                        toast.classList.add('show');
-                        
-                        setTimeout(() => {{
-                            toast.classList.remove('show');
-                            setTimeout(() => toast.remove(), 300);
-                        }}, 5000);
-                    }}
-
-                    function showNotification(title, body) {{
-                        if (audioEnabled && "Notification" in window && Notification.permission === "granted") {{
-                            new Notification(title, {{
-                                body: body,
-                                icon: "/icon.svg",
-                                vibrate: [100, 50, 100]
-                            }});
-                        }}
-                    }}
-
-                    function checkStatus() {{
-                        const statusVal = document.querySelector('.status-card .value').innerText;
-                        const currentStatus = statusVal.includes('СВІТЛО Є') ? 'up' : 'down';
-                        
-                        if (lastStatus && currentStatus !== lastStatus) {{
-                            playDing();
-                            if (currentStatus === 'up') {{
-                                showNotification("💡 Світло з'явилося!", "Електропостачання відновлено.");
-                                showToast("Світло з'явилося!", "Електропостачання відновлено.", 'up');
-                            }} else {{
-                                showNotification("🔴 Світло зникло!", "Зафіксовано відключення.");
-                                showToast("Світло зникло!", "Зафіксовано відключення.", 'down');
-                            }}
-                        }}
-                        lastStatus = currentStatus;
-                    }}
-
-                    setInterval(checkStatus, 5000);
-                    setTimeout(checkStatus, 2000);
-
-                    if ('serviceWorker' in navigator) {{
-                        window.addEventListener('load', () => {{
-                            navigator.serviceWorker.register('/service-worker.js')
-                                .then(reg => console.log('SW registered!', reg))
-                                .catch(err => console.log('SW failed!', err));
-                        }});
-                    }}
-
-                </script>
-            </body>
-            </html>
-            """
-            self.wfile.write(html.encode('utf-8'))
-            return
+        html = STATUS_PAGE_TEMPLATE.format_map({
+            "status_color": status_color,
+            "status_text": status_text,
+            "duration": duration,
+            "last_ping": last_ping,
+            "group_name": group_name,
+            "chart_version": int(time.time()),
+            "analytics_html": analytics_html,
+            "weekly_chart_html": weekly_chart_html,
+            "history_html": history_html,
+            "page_updated": page_updated,
+        })
+        self.send_body(200, "text/html; charset=utf-8", html.encode('utf-8'), NO_CACHE_HEADERS)
 
-        # 1.5 Chart Image (Daily)
-        if parsed.path.startswith("/chart.png"):
-            chart_path = "web/chart.png"
-            if os.path.exists(chart_path):
-                self.send_response(200)
-                self.send_header("Content-type", "image/png")
-                self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
-                self.send_header("Pragma", "no-cache")
-                self.send_header("Expires", "0")
-                self.end_headers()
-                with open(chart_path, "rb") as f:
-                    self.wfile.write(f.read())
-            else:
-                self.send_response(404)
-                self.end_headers()
-            return
+    def serve_daily_chart(self, path):
+        """Daily chart image"""
+        if not self.send_static("web/chart.png", "image/png", NO_CACHE_HEADERS):
+            self.send_not_found()
 
-        # 1.6 Chart Image (Weekly)
-        if parsed.path == "/weekly.png":
-            chart_path = "web/weekly.png"
-            if os.path.exists(chart_path):
-                self.send_response(200)
-                self.send_header("Content-type", "image/png")
-                self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
-                self.send_header("Pragma", "no-cache")
-                self.send_header("Expires", "0")
-                self.end_headers()
-                with open(chart_path, "rb") as f:
-                    self.wfile.write(f.read())
-            else:
-                self.send_response(404)
-                self.end_headers()
-            return
+    def serve_weekly_chart(self, path):
+        """Weekly chart image"""
+        if not self.send_static("web/weekly.png", "image/png", NO_CACHE_HEADERS):
+            self.send_not_found()
 
-        # --- PWA Static Files ---
-        if parsed.path in ["/manifest.json", "/icon.svg", "/service-worker.js"]:
-            file_map = {
-                "/manifest.json": ("application/json", "web/manifest.json"),
-                "/icon.svg": ("image/svg+xml", "web/icon.svg"),
-                "/service-worker.js": ("text/javascript", "web/service-worker.js")
-            }
-            content_type, file_path = file_map[parsed.path]
-            
-            if os.path.exists(file_path):
-                self.send_response(200)
-                self.send_header("Content-type", content_type)
-                self.end_headers()
-                with open(file_path, "rb") as f:
-                    self.wfile.write(f.read())
-            else:
-                self.send_response(404)
-                self.end_headers()
+    def serve_pwa_asset(self, path):
+        """PWA static files, preloaded at startup"""
+        asset = PWA_ASSETS.get(path)
+        if not asset:
+            self.send_not_found()
             return
 
-        # 1.6 Robots.txt
-        if parsed.path == "/robots.txt":
-            self.send_response(200)
-            self.send_header("Content-type", "text/plain")
-            self.end_headers()
-            self.wfile.write(b"User-agent: *\nAllow: /")
+        content_type, body, mtime, last_modified = asset
+        if self.not_modified(mtime):
             return
+        self.send_body(200, content_type, body, (("Last-Modified", last_modified),))
 
-        # 5. Provide JSON data for external services (like flash-monitor-kyiv)
-        if parsed.path in ["/last_schedules.json", "/schedule_history.json"]:
-            file_path = parsed.path.lstrip("/")
-            if os.path.exists(file_path):
-                self.send_response(200)
-                self.send_header("Content-type", "application/json")
-                self.send_header("Access-Control-Allow-Origin", "*")
-                self.end_headers()
-                with open(file_path, "rb") as f:
-                    self.wfile.write(f.read())
-            else:
-                self.send_response(404)
-                self.end_headers()
-                self.wfile.write(b'{"error": "file not found"}')
-            return
+    def serve_robots(self, path):
+        """Robots.txt"""
+        self.send_body(200, "text/plain", b"User-agent: *\nAllow: /")
 
-        # 2. Push API
-        if parsed.path == f"/api/push/{state['secret_key']}":
-            self.send_response(200)
-            self.send_header("Content-type", "application/json")
-            self.end_headers()
-            
-            with state_lock:
-                current_time = get_current_time()
-                previous_status = state["status"]
-                
-                # Update heartbeat
-                state["last_seen"] = current_time
-                
-                # Logic: If we were DOWN, and now we get a request -> We are UP
-                if previous_status == "down" or previous_status == "unknown":
-                    state["status"] = "up"
-                    state["came_up_at"] = current_time
-                    log_event("up", current_time)
-                    
-                    # Calculate outage duration
-                    if state["went_down_at"] > 0:
-                        duration = format_duration(current_time - state["went_down_at"])
-                    else:
-                        duration = "невідомо"
-                    
-                    sched_light_now, current_end, next_range, next_duration = get_schedule_context()
-                    
-                    time_str = datetime.datetime.fromtimestamp(current_time, KYIV_TZ).strftime("%H:%M")
-                    dev_msg = get_deviation_info(current_time, True)
-                    
-                    # Header
-                    msg = f"🟢 <b>{time_str} Світло з'явилося</b>\n\n"
-                    
-                    # Stats Block
-                    msg += "📊 <b>Статистика відключення:</b>\n"
-                    msg += f"• Світла не було: <b>{duration}</b>\n"
-                    if dev_msg:
-                        msg += f"{dev_msg}\n"
-                    
-                    # Schedule Block
-                    msg += "\n🗓 <b>Аналіз:</b>\n"
-                    
-                    sched_on_time = get_nearest_schedule_switch(current_time, True)
-                    if sched_on_time:
-                        msg += f"• За графіком світло мало з'явитися о: <b>{sched_on_time}</b>\n"
-                    
-                    if sched_light_now is False: # It appeared while it should be dark
-                        next_off_time = next_range.split(' - ')[1] if ' - ' in next_range else "час очікується"
-                        msg += f"• Наступне вимкнення: <b>{next_off_time}</b>"
-                    else: # It appeared while it should be light
-                        msg += f"• Наступне вимкнення: <b>{current_end}</b>"
-                    
-                    threading.Thread(target=send_telegram, args=(msg,)).start()
-                    trigger_daily_report_update()
-                
-                save_state()
-            
-            self.wfile.write(b'{"status": "ok", "msg": "heartbeat_received"}')
+    def serve_data_file(self, path):
+        """JSON data for external services (like flash-monitor-kyiv)"""
+        file_path = path.lstrip("/")
+        if not self.send_static(file_path, "application/json", (("Access-Control-Allow-Origin", "*"),)):
+            self.send_body(404, "application/json", b'{"error": "file not found"}')
+
+    def serve_push(self, path):
+        """Push API: a heartbeat from the device at home"""
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", PUSH_OK_LENGTH)
+        self.end_headers()
+        # The reply is fixed, so the device gets it now; it never waits on the
+        # schedule lookup or the fsync'd state save a transition does below
+        self.wfile.write(PUSH_OK_BODY)
+        self.wfile.flush()
+
+        # Only the state transition happens under the lock; logging, schedule
+        # lookups and the notification run after it is released
+        with state_lock:
+            current_time = get_current_time()
+            previous_status = state["status"]
+
+            # Update heartbeat
+            state["last_seen"] = current_time
+
+            # Logic: If we were DOWN, and now we get a request -> We are UP
+            came_up = previous_status == "down" or previous_status == "unknown"
+            if came_up:
+                state["status"] = "up"
+                state["came_up_at"] = current_time
+                went_down_at = state["went_down_at"]
+
+        if came_up:
+            heartbeat_event.set()
+            _io_executor.submit(log_event, "up", current_time)
+
+            # An outage that was never announced gets one short note instead of a down/up pair
+            brief = cancel_down_notification()
+            msg = build_transition_message(True, current_time, went_down_at, current_time, brief)
+            _telegram_executor.submit(send_telegram, msg)
+            _io_executor.submit(trigger_daily_report_update)
+            save_state()
         else:
-            self.send_response(404)
-            self.end_headers()
+            save_heartbeat_state()
+
+    PUSH_PREFIX = "/api/push/"
+
+    @classmethod
+    def is_push_path(cls, path):
+        """True for /api/push/<secret_key>, compared in constant time"""
+        if not path.startswith(cls.PUSH_PREFIX):
+            return False
+        secret = state["secret_key"]
+        if not secret:
+            return False
+        return hmac.compare_digest(path[len(cls.PUSH_PREFIX):].encode(), secret.encode())
+
+    # Exact path -> handler; the push URL depends on the secret key and is checked separately
+    ROUTES = {
+        "/": serve_status,
+        "/chart.png": serve_daily_chart,
+        "/weekly.png": serve_weekly_chart,
+        **dict.fromkeys(PWA_FILES, serve_pwa_asset),
+        "/robots.txt": serve_robots,
+        "/last_schedules.json": serve_data_file,
+        "/schedule_history.json": serve_data_file,
+    }
+
+    def do_GET(self):
+        # Only the path matters; the page's cache-busting query (?v=...) is ignored
+        path = self.path.partition("?")[0]
+        handler = self.ROUTES.get(path)
+        if handler is None and self.is_push_path(path):
+            handler = RequestHandler.serve_push
+        if handler is None:
+            self.send_not_found()
+            return
+        handler(self, path)
 
     def log_message(self, format, *args):
         return # Silence logs
 
 # --- Monitor Loop ---
 def monitor_loop():
+    """
+    Sleeps until the heartbeat deadline (last_seen + HEARTBEAT_TIMEOUT) instead of
+    polling every minute. While the status is not "up" there is nothing to time
+    out, so it waits for the push handler to signal the next comeback.
+    """
     print("Monitor loop started...")
-    while True:
-        time.sleep(60) # Check every minute
-        
+    # After a restart the saved last_seen may be stale; give the device a minute to ping
+    grace_until = get_current_time() + 60
+    while not _shutdown.is_set():
+        heartbeat_event.clear()
         with state_lock:
-            current_time = get_current_time()
-            last_seen = state["last_seen"]
-            status = state["status"]
+            deadline = state["last_seen"] + HEARTBEAT_TIMEOUT + 1 if state["status"] == "up" else None
+        
+        if deadline:
+            deadline = max(deadline, grace_until)
+        timeout = max(0.5, deadline - get_current_time()) if deadline else None
+        if heartbeat_event.wait(timeout):
+            continue # Came up or shutting down: re-arm with the new deadline, or exit
+        
+        # Later pings may have moved the deadline; check_heartbeat() re-checks it
+        check_heartbeat()
+
+def reserve_down_notification():
+    """Marks an outage message as pending; call with state_lock held. Returns its token"""
+    global _pending_down
+    token = [None, None]
+    with _pending_down_lock:
+        _pending_down = token
+    return token
+
+def defer_down_notification(token, msg):
+    """
+    Holds an outage message for DOWN_NOTIFY_DELAY seconds before queueing it, so a
+    comeback right after the timeout can replace the down/up pair with one note.
+    Does nothing if the reservation was already cancelled by a comeback.
+    """
+    timer = threading.Timer(DOWN_NOTIFY_DELAY, flush_down_notification)
+    timer.daemon = True
+    with _pending_down_lock:
+        if _pending_down is not token:
+            return
+        token[:] = [msg, timer]
+    timer.start()
+
+def flush_down_notification():
+    """Queues the pending outage message, if it has not been cancelled"""
+    global _pending_down
+    with _pending_down_lock:
+        pending, _pending_down = _pending_down, None
+    if pending and pending[0]:
+        _telegram_executor.submit(send_telegram, pending[0])
+
+def cancel_down_notification():
+    """Drops a still-pending outage message; returns True if there was one"""
+    global _pending_down
+    with _pending_down_lock:
+        pending, _pending_down = _pending_down, None
+    if not pending:
+        return False
+    if pending[1]:
+        pending[1].cancel()
+    return True
+
+def handle_sigterm(signum, frame):
+    """systemd stops the service with SIGTERM; shut down the same way as on Ctrl+C"""
+    raise KeyboardInterrupt
+
+def stop_monitor():
+    """Ends monitor_loop at its next wakeup, which this triggers immediately"""
+    _shutdown.set()
+    heartbeat_event.set()
+
+def check_heartbeat():
+    """Declares an outage if the last heartbeat is older than HEARTBEAT_TIMEOUT"""
+    timed_out = False
+    with state_lock:
+        current_time = get_current_time()
+        last_seen = state["last_seen"]
+        status = state["status"]
+        
+        # Timeout threshold: 3 minutes (180 seconds)
+        if status == "up" and (current_time - last_seen) > HEARTBEAT_TIMEOUT:
+            # Timeout detected!
+            timed_out = True
+            state["status"] = "down"
             
-            # Timeout threshold: 3 minutes (180 seconds)
-            if status == "up" and (current_time - last_seen) > 180:
-                # Timeout detected!
-                state["status"] = "down"
-                
-                # Assume outage happened 1 min after last ping
-                down_time_ts = last_seen + 60
-                state["went_down_at"] = down_time_ts
-                log_event("down", down_time_ts)
-                
-                # Calculate how long it was UP
-                if state["came_up_at"] > 0:
-                    duration = format_duration(down_time_ts - state["came_up_at"])
-                else:
-                    duration = "невідомо"
-                
-                sched_light_now, current_end, next_range, next_duration = get_schedule_context()
-                
-                time_str = datetime.datetime.fromtimestamp(down_time_ts, KYIV_TZ).strftime("%H:%M")
-                dev_msg = get_deviation_info(current_time, False)
-                
-                # Header
-                msg = f"🔴 <b>{time_str} Світло зникло!</b>\n\n"
-                
-                # Stats Block
-                msg += "📊 <b>Статистика відключення:</b>\n"
-                msg += f"• Світло було: <b>{duration}</b>\n"
-                if dev_msg:
-                    msg += f"{dev_msg}\n"
-                
-                # Schedule Block
-                msg += "\n🗓 <b>Аналіз:</b>\n"
-                
-                scheduled_off_time = get_nearest_schedule_switch(down_time_ts, False)
-                if scheduled_off_time:
-                     msg += f"• За графіком світло мало зникнути о: <b>{scheduled_off_time}</b>\n"
-                
-                if sched_light_now is True: # Should be light (but went down)
-                    expected_return = next_range.split(' - ')[1] if ' - ' in next_range else "час очікується"
-                    msg += f"• Очікуємо увімкнення: <b>{expected_return}</b>"
-                else:
-                    msg += f"• Очікуємо увімкнення: <b>{current_end}</b>"
+            # Assume outage happened 1 min after last ping
+            down_time_ts = last_seen + 60
+            state["went_down_at"] = down_time_ts
+            came_up_at = state["came_up_at"]
+            notification = reserve_down_notification()
+    
+    if timed_out:
+        _io_executor.submit(log_event, "down", down_time_ts)
+        
+        msg = build_transition_message(False, down_time_ts, came_up_at, current_time)
+        defer_down_notification(notification, msg)
+        _io_executor.submit(trigger_daily_report_update)
+        save_state()
 
-                threading.Thread(target=send_telegram, args=(msg,)).start()
-                trigger_daily_report_update()
-                save_state()
+HTTP_WORKERS = 8
+HTTP_BACKLOG = 32  # accepted connections allowed to wait for a free worker
+PUSH_PEEK_TIMEOUT = 0.2  # how long to wait for a request line when every worker is busy
+BUSY_RESPONSE = b"HTTP/1.0 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+class PooledHTTPServer(http.server.ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer that hands connections to a fixed pool of HTTP_WORKERS
+    daemon threads through a queue of at most HTTP_BACKLOG, instead of starting
+    a thread per connection. Past that, connections get a 503 and are closed
+    rather than piling up with their sockets open.
+    
+    Idle or slow clients can hold every worker for up to the handler timeout,
+    so while all of them are busy a device heartbeat is recognized from its
+    request line and served on a thread of its own instead of queueing.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._requests = queue.Queue(maxsize=HTTP_BACKLOG)
+        self._idle_workers = HTTP_WORKERS
+        self._idle_lock = threading.Lock()
+        for i in range(HTTP_WORKERS):
+            threading.Thread(target=self._worker, name=f"http-{i}", daemon=True).start()
+
+    def _worker(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            with self._idle_lock:
+                self._idle_workers -= 1
+            try:
+                self.process_request_thread(*item)
+            finally:
+                with self._idle_lock:
+                    self._idle_workers += 1
+
+    def process_request(self, request, client_address):
+        if self._idle_workers == 0 and self.is_push_request(request):
+            threading.Thread(target=self.process_request_thread,
+                             args=(request, client_address), daemon=True).start()
+            return
+        try:
+            self._requests.put_nowait((request, client_address))
+        except queue.Full:
+            try:
+                request.sendall(BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+
+    def is_push_request(self, request):
+        """Peeks at the request line; True if it is a GET of the push URL"""
+        try:
+            request.settimeout(PUSH_PEEK_TIMEOUT)
+            head = request.recv(512, socket.MSG_PEEK)
+        except OSError:
+            return False
+        finally:
+            request.settimeout(None)
+        parts = head.split(b" ", 2)
+        if len(parts) < 3 or parts[0] != b"GET":
+            return False
+        return RequestHandler.is_push_path(parts[1].decode("latin-1").partition("?")[0])
+
+    def server_close(self):
+        super().server_close()
+        # Drop connections still waiting for a worker, then let the idle workers exit
+        while True:
+            try:
+                item = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            self.shutdown_request(item[0])
+        for _ in range(HTTP_WORKERS):
+            try:
+                self._requests.put_nowait(None)
+            except queue.Full:
+                break
+
+def make_server(address):
+    """
+    Pooled HTTP server for RequestHandler. The listening address is reusable
+    across quick restarts.
+    """
+    return PooledHTTPServer(address, RequestHandler)
 
 # --- Main Execution ---
 if __name__ == "__main__":
@@ -934,6 +1528,7 @@ if __name__ == "__main__":
         print(f"Config loaded. ChatID: {CHAT_ID}", flush=True)
         
     load_state()
+    migrate_event_log()
     print(f"Push URL: http://<YOUR_IP>:{PORT}/api/push/{state['secret_key']}")
     
     # Write the URL to a file so the user can see it easily
@@ -945,10 +1540,15 @@ if __name__ == "__main__":
     monitor_thread.start()
     
     # Start HTTP Server
-    socketserver.TCPServer.allow_reuse_address = True
-    server = socketserver.ThreadingTCPServer(("", PORT), RequestHandler)
+    server = make_server(("", PORT))
+    signal.signal(signal.SIGTERM, handle_sigterm)
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         print("Stopping server...")
+        stop_monitor()
         server.server_close()
+        flush_down_notification()
+    finally:
+        # However serve_forever ended (Ctrl+C, SIGTERM or an error), write out any throttled state
+        flush_state()
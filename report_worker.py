@@ -0,0 +1,57 @@
+"""
+Long-lived report generator for power_monitor_server.py.
+
+Imports matplotlib once, then reads one command per line from stdin:
+    daily   - daily report (chart, stats.json, Telegram), then the weekly web chart
+    weekly  - weekly web chart only (web/weekly.png)
+Each script still runs as __main__ via runpy with its usual arguments, so its
+behaviour is unchanged; only the interpreter start-up and imports are saved.
+"""
+import os
+import sys
+import runpy
+
+# Warm the heavy imports the report scripts share
+import matplotlib.pyplot  # noqa: F401
+import matplotlib.dates  # noqa: F401
+import requests  # noqa: F401
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DAILY = ["generate_daily_report.py"]
+WEEKLY = ["generate_weekly_report.py", "--output", os.path.join(PROJECT_DIR, "web", "weekly.png")]
+
+def run_script(argv):
+    """Runs a report script as __main__ with argv; returns True if it succeeded"""
+    script = os.path.join(PROJECT_DIR, argv[0])
+    saved_argv = sys.argv
+    sys.argv = [script, *argv[1:]]
+    try:
+        runpy.run_path(script, run_name="__main__")
+        return True
+    except SystemExit as e:
+        return e.code in (None, 0)
+    except Exception as e:
+        print(f"Report {argv[0]} failed: {e}")
+        return False
+    finally:
+        sys.argv = saved_argv
+
+def main():
+    for line in sys.stdin:
+        cmd = line.strip()
+        if cmd == "daily":
+            print("Triggering daily report update...")
+            # Weekly chart follows only a successful daily run, as before
+            if run_script(DAILY):
+                print("Triggering weekly report update...")
+                run_script(WEEKLY)
+        elif cmd == "weekly":
+            print("Triggering weekly report update...")
+            run_script(WEEKLY)
+        elif cmd:
+            print(f"Unknown report command: {cmd}")
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()